@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+This module provides conditional GET (ETag / If-None-Match) helpers and
+negotiated response compression for the API.
+"""
+from flask import Response, request
+from os import getenv
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESS_MIN_SIZE = int(getenv('COMPRESS_MIN_SIZE', '1024'))
+ENCODINGS = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def not_modified(etag: str) -> Response:
+    """
+    Checks the If-None-Match header of the current request against an
+    ETag, before anything is serialised.
+
+    Args:
+        etag (str): The strong ETag of the resource, without quotes.
+
+    Returns:
+        Response: An empty 304 response carrying the ETag if the client
+        already has this version, otherwise None.
+    """
+    if_none_match = request.if_none_match
+    if if_none_match and (etag in if_none_match or
+                          any('{}-{}'.format(etag, e) in if_none_match
+                              for e in ENCODINGS)):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    """
+    Sets the ETag of a response.
+
+    Args:
+        response (Response): The response.
+        etag (str): The strong ETag of the resource, without quotes.
+
+    Returns:
+        Response: The response.
+    """
+    response.set_etag(etag)
+    return response
+
+
+def compress(response: Response) -> Response:
+    """
+    Flask after_request hook that compresses the response body with the
+    best encoding accepted by the client (br if available, then gzip),
+    when the body is at least COMPRESS_MIN_SIZE bytes long.
+
+    The ETag of a compressed response gets an encoding suffix, so each
+    representation keeps a distinct strong validator.
+
+    Args:
+        response (Response): The response about to be sent.
+
+    Returns:
+        Response: The response, compressed or not.
+    """
+    if response.status_code != 200 or response.direct_passthrough or \
+       response.is_streamed or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    if encoding == 'br':
+        response.set_data(brotli.compress(data))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag('{}-{}'.format(etag, encoding), weak)
+    return response
@@ -1,19 +1,42 @@
 #!/usr/bin/env python3
 """ Module of Users views
 """
+from api.v1.http_cache import not_modified, with_etag
 from api.v1.views import app_views
 from flask import abort, jsonify, request
 from models.user import User
 
 
+def user_etag(user: User) -> str:
+    """ Strong ETag of one User, derived from its ID and updated_at
+    """
+    return "{}-{:.6f}".format(user.id, user.updated_at.timestamp())
+
+
+def users_etag(users: list) -> str:
+    """ Strong ETag of the User list, derived from the number of users
+    and the latest updated_at (every create and update moves it, every
+    delete changes the count)
+    """
+    latest = max((user.updated_at for user in users), default=None)
+    return "{}-{:.6f}".format(
+        len(users), latest.timestamp() if latest is not None else 0)
+
+
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
     Return:
       - list of all User objects JSON represented
+      - 304 if the If-None-Match header matches the current ETag
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    users = User.all()
+    etag = users_etag(users)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    all_users = [user.to_json() for user in users]
+    return with_etag(jsonify(all_users), etag)
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -23,6 +46,7 @@ def view_one_user(user_id: str = None) -> str:
       - User ID
     Return:
       - User object JSON represented
+      - 304 if the If-None-Match header matches the current ETag
       - 404 if the User ID doesn't exist
     """
     if user_id is None:
@@ -30,7 +54,11 @@ def view_one_user(user_id: str = None) -> str:
     user = User.get(user_id)
     if user is None:
         abort(404)
-    return jsonify(user.to_json())
+    etag = user_etag(user)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    return with_etag(jsonify(user.to_json()), etag)
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
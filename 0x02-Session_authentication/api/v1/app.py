@@ -4,30 +4,109 @@ Route module for the API
 """
 from os import getenv
 from api.v1.auth.auth import Auth
+from api.v1.auth.auth_chain import AuthChain
 from api.v1.auth.session_auth import SessionAuth
 from api.v1.auth.basic_auth import BasicAuth
+from api.v1.auth.path_matcher import PathMatcher
+from api.v1.http_cache import compress
+from api.v1.rate_limit import CLIENT_IP, RateLimitExceeded, request_ip
+from api.v1.metrics import AUTH_LATENCY, REQUEST_LATENCY
 from api.v1.views import app_views
-from flask import Flask, jsonify, abort, request
+from flask import Flask, jsonify, abort, request, g, current_app
 from flask_cors import (CORS, cross_origin)
+from models.user import User
+import gc
 import os
+import time
 
 
-app = Flask(__name__)
-app.register_blueprint(app_views)
-CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
+EXCLUDED_PATHS = PathMatcher(getenv(
+    'AUTH_EXCLUDED_PATHS',
+    '/api/v1/status/,/api/v1/unauthorized/,/api/v1/forbidden/,'
+    '/api/v1/auth_session/login/,/api/v1/metrics/').split(','))
+
+MODELS = [User]
 
 auth = None
-auth_type = getenv('AUTH_TYPE')
-if auth_type:
+_data_loaded = False
+
+
+def build_auth() -> Auth:
+    """
+    Builds the authentication object selected by the AUTH_TYPE
+    environment variable.
+
+    Returns:
+        Auth: The authentication object, or None if AUTH_TYPE is not set.
+    """
+    auth_type = getenv('AUTH_TYPE')
+    if not auth_type:
+        return None
     if auth_type == 'basic_auth':
-        auth = BasicAuth()
-    elif auth_type == 'session_auth':
-        auth = SessionAuth()
-    else:
-        auth = Auth()
+        return BasicAuth()
+    if auth_type == 'session_auth':
+        return SessionAuth()
+    if auth_type == 'auth_chain':
+        return AuthChain(getenv('AUTH_CHAIN',
+                                'session_auth,basic_auth').split(','))
+    return Auth()
+
+
+def load_data() -> None:
+    """
+    Startup hook that loads every model from storage, and the session
+    snapshots when enabled, once per process.
+
+    When run in a preloading master (e.g. `gunicorn --preload`), the data
+    is loaded before the workers are forked, then moved out of the
+    garbage collector's tracking with `gc.freeze()`: collections in the
+    workers no longer touch those objects, so their memory pages stay
+    shared copy-on-write instead of being copied into every worker.
+    """
+    global _data_loaded
+    if _data_loaded:
+        return
+    for model in MODELS:
+        model.load_from_file()
+    if SessionAuth.snapshotter is not None:
+        SessionAuth.snapshotter.load()
+    gc.collect()
+    gc.freeze()
+    _data_loaded = True
+
+
+def create_app(load: bool = True) -> Flask:
+    """
+    Application factory of the API.
+
+    Args:
+        load (bool): Whether to run the `load_data` startup hook.
+
+    Returns:
+        Flask: The configured application. Its authentication object is
+        available as `app.extensions['auth']`.
+    """
+    global auth
+    app = Flask(__name__)
+    app.register_blueprint(app_views)
+    CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
+
+    auth = build_auth()
+    app.extensions['auth'] = auth
+
+    app.register_error_handler(401, handle_unauthorized_error)
+    app.register_error_handler(403, handle_forbidden_error)
+    app.register_error_handler(404, not_found)
+    app.register_error_handler(RateLimitExceeded, handle_rate_limited)
+    app.before_request(before_request)
+    app.after_request(compress)
+    app.after_request(after_request)
+
+    if load:
+        load_data()
+    return app
 
 
-@app.errorhandler(401)
 def handle_unauthorized_error(error) -> str:
     """
     Handles the 401 Unauthorized error.
@@ -41,7 +120,6 @@ def handle_unauthorized_error(error) -> str:
     return jsonify({"error": "Unauthorized"}), 401
 
 
-@app.errorhandler(403)
 def handle_forbidden_error(error) -> str:
     """
     Handle the 403 resource not allowed to access error.
@@ -55,36 +133,75 @@ def handle_forbidden_error(error) -> str:
     return jsonify({"error": "Forbidden"}), 403
 
 
-@app.errorhandler(404)
 def not_found(error) -> str:
     """ Not found handler
     """
     return jsonify({"error": "Not found"}), 404
 
 
-@app.before_request
+def handle_rate_limited(error: RateLimitExceeded) -> str:
+    """
+    Handles a rate limited request with a 429 Too Many Requests error.
+
+    Args:
+            error (RateLimitExceeded): The exception raised by the limiter.
+
+    Returns:
+            str: JSON-encoded string containing the error message, with a
+            Retry-After header.
+    """
+    response = jsonify({"error": "Too many requests"})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+
 def before_request():
     """
     Flask before_request decorator that performs authentication checks.
 
     Notes:
         - The `auth` object is assumed to be an instance of the `Auth` class.
+        - Credentials are resolved once; the outcome is available to views
+          as `request.auth_context` and `request.current_user`.
+        - The client IP is recorded in `CLIENT_IP` for the rate limiting
+          of Basic password checks.
     """
+    g.request_start = time.perf_counter()
+    auth = current_app.extensions.get('auth')
     if auth:
-        request.current_user = auth.current_user(request)
-        path = request.path
-        paths = ['/api/v1/status/',
-                 '/api/v1/unauthorized/', '/api/v1/forbidden/',
-                 '/api/v1/auth_session/login/']
-        if auth.require_auth(path, paths):
-            if auth.authorization_header(request) is None and\
-               auth.session_cookie(request) is None:
-                abort(401)
-            if auth.current_user(request) is None:
-                abort(403)
+        try:
+            CLIENT_IP.set(request_ip(request))
+            context = auth.authenticate(request)
+            request.current_user = context.user
+            if auth.require_auth(request.path, EXCLUDED_PATHS):
+                if not context.has_credentials:
+                    abort(401)
+                if context.user is None:
+                    abort(403)
+        finally:
+            AUTH_LATENCY.observe(time.perf_counter() - g.request_start)
+
+
+def after_request(response):
+    """
+    Flask after_request hook that records the request latency per route.
+
+    Args:
+        response (Response): The response about to be sent.
+
+    Returns:
+        Response: The unchanged response.
+    """
+    start = g.get('request_start')
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe(time.perf_counter() - start, route,
+                                request.method, response.status_code)
+    return response
 
 
 if __name__ == "__main__":
+    app = create_app()
     host = getenv("API_HOST", "0.0.0.0")
     port = getenv("API_PORT", "5000")
     app.run(host=host, port=port)
@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+"""
+ASGI variant of the API, built with Quart (the asyncio implementation of
+the Flask API).
+
+Views are coroutines: password hashing runs in a thread pool, session
+lookups in another, and storage writes (objects and sessions) in a
+dedicated single-thread executor, so a worker keeps serving other requests
+while a login, a session store query or a save is in progress.
+
+Run with an ASGI server, e.g.:
+    hypercorn --workers 1 --bind 0.0.0.0:5000 'api.v1.asgi:create_app()'
+"""
+from api.v1.app import EXCLUDED_PATHS, build_auth, load_data
+from api.v1.http_cache import (COMPRESS_MIN_SIZE, best_encoding, encode_body,
+                               etag_matches, mark_encoded, with_etag)
+from api.v1.metrics import (AUTH_LATENCY, CONTENT_TYPE, REGISTRY,
+                            REQUEST_LATENCY)
+from api.v1.pagination import page_headers, parse_page_args, stream_json_array
+from api.v1.rate_limit import (CLIENT_IP, RateLimitExceeded, check_email,
+                               check_ip, request_ip)
+from api.v1.views.users import (BULK_MAX_USERS, build_bulk_users,
+                                filter_user_ids, parse_bulk_records)
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from models.user import User
+from os import getenv
+from quart import (Blueprint, Quart, Response, abort, current_app, g,
+                   jsonify, request)
+from quart.wrappers.response import IterableBody
+import asyncio
+import contextvars
+import time
+
+
+HASH_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(getenv('HASH_WORKERS', '4')),
+    thread_name_prefix='hash')
+SESSION_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(getenv('SESSION_WORKERS', '4')),
+    thread_name_prefix='session')
+STORAGE_EXECUTOR = ThreadPoolExecutor(max_workers=1,
+                                      thread_name_prefix='storage')
+
+ERROR_MESSAGES = {401: "Unauthorized", 403: "Forbidden", 404: "Not found"}
+
+app_views = Blueprint("app_views", __name__, url_prefix="/api/v1")
+
+
+async def run_hashing(func, *args):
+    """
+    Runs a password hashing function in the hashing thread pool, in a
+    copy of the current context (for `CLIENT_IP`).
+
+    Args:
+        func (callable): The function to run.
+        args: Its positional arguments.
+
+    Returns:
+        The result of the function.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        HASH_EXECUTOR, partial(contextvars.copy_context().run, func, *args))
+
+
+async def run_sessions(func, *args):
+    """
+    Runs a session store lookup in the session thread pool, so stores
+    that block (SQLite) do not stall the event loop.
+
+    Args:
+        func (callable): The function to run.
+        args: Its positional arguments.
+
+    Returns:
+        The result of the function.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(SESSION_EXECUTOR, func, *args)
+
+
+async def run_storage(func, *args):
+    """
+    Runs a storage function in the storage executor. A single thread is
+    used so file writes are never interleaved.
+
+    Args:
+        func (callable): The function to run.
+        args: Its positional arguments.
+
+    Returns:
+        The result of the function.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(STORAGE_EXECUTOR, func, *args)
+
+
+def not_modified(etag: str) -> Response:
+    """
+    Checks the If-None-Match header of the current request against an
+    ETag, like `http_cache.not_modified` for the WSGI application.
+
+    Args:
+        etag (str): The strong ETag of the resource, without quotes.
+
+    Returns:
+        Response: An empty 304 response carrying the ETag if the client
+        already has this version, otherwise None.
+    """
+    if etag_matches(request.if_none_match, etag):
+        response = Response('', status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+@app_views.route('/status', methods=['GET'], strict_slashes=False)
+async def status() -> str:
+    """ GET /api/v1/status
+    Return:
+      - the status of the API
+    """
+    return jsonify({"status": "OK"})
+
+
+@app_views.route('/stats/', strict_slashes=False)
+async def stats() -> str:
+    """ GET /api/v1/stats
+    Return:
+      - the number of each objects
+    """
+    return jsonify({'users': User.count()})
+
+
+@app_views.route('/metrics', methods=['GET'], strict_slashes=False)
+async def metrics() -> Response:
+    """ GET /api/v1/metrics
+    Return:
+      - the metrics in the Prometheus text format
+    """
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+@app_views.route('/unauthorized', strict_slashes=False)
+async def unauthorized() -> None:
+    """ GET /api/v1/unauthorized
+    Raises:
+      - 401 Unauthorized
+    """
+    abort(401)
+
+
+@app_views.route('/forbidden', strict_slashes=False)
+async def forbidden() -> None:
+    """ GET /api/v1/forbidden
+    Raises:
+      - 403 Forbidden
+    """
+    abort(403)
+
+
+@app_views.route('/users', methods=['GET'], strict_slashes=False)
+async def view_all_users() -> str:
+    """ GET /api/v1/users
+    Query parameters:
+      - limit (optional): page size, up to PAGE_SIZE_MAX
+      - cursor (optional): X-Next-Cursor of the previous page
+      - email (optional): exact email
+      - email_prefix (optional): case-insensitive email prefix
+      - name_prefix (optional): case-insensitive first or last name prefix
+      - fields (optional): comma-separated fields of each User
+    Return:
+      - list of the (matching) User objects JSON represented, in ID
+        order: one page if `limit` is given, otherwise all of them (after
+        `cursor`), streamed as a chunked JSON array
+      - X-Total-Count and X-Next-Cursor (when more pages follow) headers
+      - 304 if the If-None-Match header matches the current ETag
+      - 400 if `limit` or `fields` is invalid
+    """
+    try:
+        cursor, limit = parse_page_args(request.args)
+        fields = User.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    etag = User.generation()
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    ids = filter_user_ids(request.args)
+    total = User.count() if ids is None else len(ids)
+    if limit is None:
+        response = Response(
+            stream_json_array(User, current_app.json.dumps, cursor, ids,
+                              fields),
+            mimetype='application/json')
+        next_cursor = None
+    else:
+        users, next_cursor = User.page(cursor, limit, ids)
+        response = jsonify([user.to_json(fields=fields) for user in users])
+    response.headers.update(page_headers(total, next_cursor))
+    return with_etag(response, etag)
+
+
+@app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
+async def view_one_user(user_id: str = None) -> str:
+    """ GET /api/v1/users/:id
+    Path parameter:
+      - User ID, or `me` for the authenticated user
+    Query parameter:
+      - fields (optional): comma-separated fields to return
+    Return:
+      - User object JSON represented
+      - 304 if the If-None-Match header matches the current ETag
+      - 400 if `fields` is invalid
+      - 404 if the User ID doesn't exist
+    """
+    try:
+        fields = User.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if user_id == 'me':
+        context = getattr(request, 'auth_context', None)
+        user = context.user if context is not None else None
+    else:
+        user = User.get(user_id)
+    if user is None:
+        abort(404)
+    etag = user.version()
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    return with_etag(jsonify(user.to_json(fields=fields)), etag)
+
+
+@app_views.route('/users/<user_id>', methods=['DELETE'],
+                 strict_slashes=False)
+async def delete_user(user_id: str = None) -> str:
+    """ DELETE /api/v1/users/:id
+    Path parameter:
+      - User ID
+    Return:
+      - empty JSON is the User has been correctly deleted
+      - 404 if the User ID doesn't exist
+    """
+    user = User.get(user_id)
+    if user is None:
+        abort(404)
+    await run_storage(user.remove)
+    destroy_all_sessions = getattr(current_app.extensions['auth'],
+                                   'destroy_all_sessions', None)
+    if destroy_all_sessions is not None:
+        await run_storage(destroy_all_sessions, user.id)
+    return jsonify({}), 200
+
+
+@app_views.route('/users', methods=['POST'], strict_slashes=False)
+async def create_user() -> str:
+    """ POST /api/v1/users/
+    JSON body:
+      - email
+      - password
+      - last_name (optional)
+      - first_name (optional)
+    Return:
+      - User object JSON represented
+      - 400 if can't create the new User
+    """
+    rj = await request.get_json(silent=True)
+    error_msg = None
+    if rj is None:
+        error_msg = "Wrong format"
+    if error_msg is None and rj.get("email", "") == "":
+        error_msg = "email missing"
+    if error_msg is None and rj.get("password", "") == "":
+        error_msg = "password missing"
+    if error_msg is None:
+        try:
+            user = User()
+            user.email = rj.get("email")
+            await run_hashing(setattr, user, 'password', rj.get("password"))
+            user.first_name = rj.get("first_name")
+            user.last_name = rj.get("last_name")
+            await run_storage(user.save)
+            return jsonify(user.to_json()), 201
+        except Exception as e:
+            error_msg = "Can't create User: {}".format(e)
+    return jsonify({'error': error_msg}), 400
+
+
+@app_views.route('/users/bulk', methods=['POST'], strict_slashes=False)
+async def create_users() -> str:
+    """ POST /api/v1/users/bulk
+    Body: a JSON array, or NDJSON (one JSON object per line), of users:
+      - email
+      - password
+      - last_name (optional)
+      - first_name (optional)
+    Every record is validated before anything is saved, then the valid
+    ones are saved with a single write of the store.
+    Return:
+      - list of the results, in the order of the records: the User
+        object JSON represented, or {"error": ...} for an invalid record
+      - 400 if the body can't be read, has more than BULK_MAX_USERS
+        records, or the Users can't be saved
+    """
+    try:
+        records = parse_bulk_records(await request.get_data())
+    except ValueError:
+        return jsonify({'error': "Wrong format"}), 400
+    if len(records) > BULK_MAX_USERS:
+        return jsonify({'error': "Too many users (max {})".format(
+            BULK_MAX_USERS)}), 400
+    users, results = await run_hashing(build_bulk_users, records)
+    try:
+        await run_storage(User.save_many, users)
+    except Exception as e:
+        return jsonify({'error': "Can't create Users: {}".format(e)}), 400
+    return jsonify([result if isinstance(result, dict) else result.to_json()
+                    for result in results]), 200
+
+
+@app_views.route('/users/<user_id>', methods=['PUT'], strict_slashes=False)
+async def update_user(user_id: str = None) -> str:
+    """ PUT /api/v1/users/:id
+    Path parameter:
+      - User ID
+    JSON body:
+      - last_name (optional)
+      - first_name (optional)
+    Return:
+      - User object JSON represented
+      - 404 if the User ID doesn't exist
+      - 400 if can't update the User
+    """
+    user = User.get(user_id)
+    if user is None:
+        abort(404)
+    rj = await request.get_json(silent=True)
+    if rj is None:
+        return jsonify({'error': "Wrong format"}), 400
+    if rj.get('first_name') is not None:
+        user.first_name = rj.get('first_name')
+    if rj.get('last_name') is not None:
+        user.last_name = rj.get('last_name')
+    await run_storage(user.save)
+    return jsonify(user.to_json()), 200
+
+
+@app_views.route('/auth_session/login', methods=['POST'],
+                 strict_slashes=False)
+async def session_login():
+    """ POST /api/v1/auth_session/login
+    Form body:
+      - email
+      - password
+    Return:
+      - User object JSON represented, with the session cookie set
+      - 400 if the email or the password is missing
+      - 404 if no user has this email
+      - 401 if the password is wrong
+      - 429 if the client IP or the email has no login attempt left
+    """
+    form = await request.form
+    user_email = form.get('email')
+    user_password = form.get('password')
+
+    if not user_email:
+        return jsonify({"error": "email missing"}), 400
+
+    if not user_password:
+        return jsonify({"error": "password missing"}), 400
+
+    check_ip(request_ip(request))
+    check_email(user_email)
+    if not User.email_may_exist(user_email):
+        return jsonify({"error": "no user found for this email"}), 404
+    users = User.search({"email": user_email})
+    if not users:
+        return jsonify({"error": "no user found for this email"}), 404
+
+    for user in users:
+        if await run_hashing(user.is_valid_password, user_password):
+            auth = current_app.extensions['auth']
+            session_id = await run_storage(auth.create_session, user.id)
+            response = jsonify(user.to_json())
+            response.set_cookie(getenv('SESSION_NAME'), session_id)
+            return response
+
+    return jsonify({"error": "wrong password"}), 401
+
+
+@app_views.route('/auth_session/logout', methods=['DELETE'],
+                 strict_slashes=False)
+async def session_logout():
+    """ DELETE /api/v1/auth_session/logout
+    Return:
+      - empty JSON once the session of the request is deleted
+      - 404 if the request has no valid session
+    """
+    auth = current_app.extensions['auth']
+    destroy_session = getattr(auth, 'destroy_session', None)
+    if destroy_session is None or not await run_storage(
+            destroy_session, request._get_current_object()):
+        abort(404)
+    return jsonify({}), 200
+
+
+async def handle_http_error(error) -> str:
+    """
+    Handles the 401, 403 and 404 errors with a JSON error message.
+
+    Args:
+        error (HTTPException): The exception representing the error.
+
+    Returns:
+        str: JSON-encoded string containing the error message.
+    """
+    return jsonify({"error": ERROR_MESSAGES[error.code]}), error.code
+
+
+async def handle_rate_limited(error: RateLimitExceeded) -> str:
+    """
+    Handles a rate limited request with a 429 Too Many Requests error
+    and a Retry-After header.
+    """
+    response = jsonify({"error": "Too many requests"})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+
+async def before_request():
+    """
+    Authenticates the request. Credentials that need a password check
+    (an Authorization header) are verified in the hashing thread pool,
+    session cookies are looked up in the session thread pool.
+    """
+    g.request_start = time.perf_counter()
+    auth = current_app.extensions.get('auth')
+    if not auth:
+        return
+    try:
+        CLIENT_IP.set(request_ip(request))
+        if auth.authorization_header(request) is not None:
+            context = await run_hashing(auth.authenticate,
+                                        request._get_current_object())
+        elif auth.session_cookie(request) is not None:
+            context = await run_sessions(auth.authenticate,
+                                         request._get_current_object())
+        else:
+            context = auth.authenticate(request)
+        request.current_user = context.user
+        if auth.require_auth(request.path, EXCLUDED_PATHS):
+            if not context.has_credentials:
+                abort(401)
+            if context.user is None:
+                abort(403)
+    finally:
+        AUTH_LATENCY.observe(time.perf_counter() - g.request_start)
+
+
+async def after_request(response):
+    """
+    Records the request latency per route and allows cross-origin
+    requests, like the CORS setup of the WSGI application.
+    """
+    start = g.get('request_start')
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe(time.perf_counter() - start, route,
+                                request.method, response.status_code)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+
+async def compress(response):
+    """
+    Compresses the response body like `http_cache.compress` does for the
+    WSGI application: with the best encoding accepted by the client, when
+    the body is at least COMPRESS_MIN_SIZE bytes long and not streamed.
+    """
+    if response.status_code != 200 or \
+       isinstance(response.response, IterableBody) or \
+       'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = best_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    data = await response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    response.set_data(encode_body(data, encoding))
+    mark_encoded(response, encoding)
+    return response
+
+
+def create_app(load: bool = True) -> Quart:
+    """
+    Application factory of the ASGI API.
+
+    Args:
+        load (bool): Whether to run the `load_data` startup hook.
+
+    Returns:
+        Quart: The configured application.
+    """
+    app = Quart(__name__)
+    app.register_blueprint(app_views)
+    app.extensions['auth'] = build_auth()
+
+    for code in ERROR_MESSAGES:
+        app.register_error_handler(code, handle_http_error)
+    app.register_error_handler(RateLimitExceeded, handle_rate_limited)
+    app.before_request(before_request)
+    app.after_request(compress)
+    app.after_request(after_request)
+
+    if load:
+        load_data()
+    return app
+
+
+if __name__ == "__main__":
+    host = getenv("API_HOST", "0.0.0.0")
+    port = getenv("API_PORT", "5000")
+    create_app().run(host=host, port=int(port))
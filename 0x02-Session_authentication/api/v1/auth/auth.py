@@ -3,15 +3,46 @@
 This module provides the `Auth` class, which serves as a template
 for all authentication systems.
 """
+from api.v1.auth.path_matcher import PathMatcher
 from flask import request
 from typing import List, TypeVar, Optional
 import os
 
 
+class AuthContext:
+    """
+    AuthContext holds the outcome of authenticating one request, so the
+    credentials are resolved exactly once per request.
+
+    Attributes:
+        user (User): The authenticated user, or None.
+        scheme (str): The scheme that authenticated the request ('basic',
+        'session'), or None if no user was resolved.
+        has_credentials (bool): Whether the request carried an
+        Authorization header or a session cookie.
+    """
+
+    def __init__(self, user=None, scheme: Optional[str] = None,
+                 has_credentials: bool = False):
+        """
+        Initializes an AuthContext.
+
+        Args:
+            user (User): The authenticated user. (optional)
+            scheme (str): The authenticating scheme. (optional)
+            has_credentials (bool): Whether credentials were sent.
+        """
+        self.user = user
+        self.scheme = scheme if user is not None else None
+        self.has_credentials = has_credentials
+
+
 class Auth:
     """
     Auth class serves as a template for all authentication systems.
     """
+    scheme = None
+    authorization_scheme = None
 
     def __init__(self):
         """
@@ -22,6 +53,8 @@ class Auth:
         assigns a default session name of '_my_session_id'.
         """
         self.session_name = os.environ.get('SESSION_NAME', '_my_session_id')
+        self._excluded_source = None
+        self._excluded_matcher = None
 
     def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
         """
@@ -29,24 +62,23 @@ class Auth:
 
         Args:
             path (str): The path to check for authentication requirement.
-            excluded_paths (List[str]): A list of paths excluded from
-            authentication requirement.
+            excluded_paths (List[str] or PathMatcher): The paths excluded
+            from authentication requirement. A list is compiled into a
+            `PathMatcher` once and reused while the same list is passed.
 
         Returns:
             bool: Returns False if `path` is in `excluded_paths`, taking
-            into account the slash tolerance. Otherwise True.
+            into account the slash tolerance and `*` wildcards. Otherwise
+            True.
         """
-        if path is None or excluded_paths is None or excluded_paths == []:
+        if path is None or not excluded_paths:
             return True
-        path_t = (path if '/' == path[len(path) - 1] else path + '/')
-        for path in excluded_paths:
-            if path[len(path) - 1] == '*':
-                sub_path = path[:len(path) - 1]
-                if sub_path in path_t:
-                    return False
-        if path_t in excluded_paths:
-            return False
-        return True
+        if not isinstance(excluded_paths, PathMatcher):
+            if excluded_paths is not self._excluded_source:
+                self._excluded_source = excluded_paths
+                self._excluded_matcher = PathMatcher(excluded_paths)
+            excluded_paths = self._excluded_matcher
+        return not excluded_paths.match(path)
 
     def authorization_header(self, request=None) -> str:
         """
@@ -75,6 +107,47 @@ class Auth:
         """
         return None
 
+    def user_from_credentials(
+            self, authorization_header: Optional[str],
+            session_id: Optional[str]) -> TypeVar('User'):
+        """
+        Resolves the user from credentials already read from the request.
+
+        Args:
+            authorization_header (str): The Authorization header value.
+            session_id (str): The session cookie value.
+
+        Returns:
+            TypeVar('User'): The user, or None if not authenticated.
+        """
+        return None
+
+    def authenticate(self, request=None) -> AuthContext:
+        """
+        Reads the credentials of a request once and resolves its user.
+
+        The result is stored on the request as `auth_context`, so calling
+        this again for the same request does not repeat the work.
+
+        Args:
+            request (object): The Flask request object. (optional)
+
+        Returns:
+            AuthContext: The authentication outcome of the request.
+        """
+        if request is None:
+            return AuthContext()
+        context = getattr(request, 'auth_context', None)
+        if context is not None:
+            return context
+        header = self.authorization_header(request)
+        session_id = self.session_cookie(request)
+        context = AuthContext(
+            self.user_from_credentials(header, session_id), self.scheme,
+            header is not None or session_id is not None)
+        request.auth_context = context
+        return context
+
     def session_cookie(
             self, request: Optional[object] = None) -> Optional[str]:
         """
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+This module provides the `AuthChain` class, which serves several
+authentication schemes at once and dispatches each request to one of them.
+"""
+from api.v1.auth.auth import Auth, AuthContext
+from api.v1.auth.basic_auth import BasicAuth
+from api.v1.auth.session_auth import SessionAuth
+from api.v1.metrics import REGISTRY, Counter
+from typing import List, Optional, TypeVar
+
+
+AUTHENTICATORS = {
+    'basic_auth': BasicAuth,
+    'session_auth': SessionAuth,
+}
+
+CHAIN_REQUESTS = REGISTRY.register(Counter(
+    'auth_chain_requests_total',
+    'Requests dispatched by the authentication chain.',
+    ('scheme', 'outcome')))
+
+
+class AuthChain(Auth):
+    """
+    AuthChain dispatches each request to a single authenticator, chosen
+    from the request in O(1): by the scheme prefix of the Authorization
+    header (e.g. `Basic`), or by the presence of the session cookie.
+    When both are present, the first one in the configured order wins.
+    """
+
+    def __init__(self, names: List[str]):
+        """
+        Initializes the chain.
+
+        Args:
+            names (List[str]): The ordered authenticator names, taken
+            from `AUTHENTICATORS` (e.g. ['session_auth', 'basic_auth']).
+
+        Raises:
+            ValueError: If a name is unknown or the list is empty.
+        """
+        super().__init__()
+        self.authenticators = []
+        self._by_scheme = {}
+        self._by_cookie = None
+        for rank, name in enumerate(names):
+            name = name.strip()
+            if name not in AUTHENTICATORS:
+                raise ValueError('Unknown authenticator: {}'.format(name))
+            authenticator = AUTHENTICATORS[name]()
+            self.authenticators.append(authenticator)
+            if isinstance(authenticator, SessionAuth):
+                if self._by_cookie is None:
+                    self._by_cookie = (rank, authenticator)
+            elif authenticator.authorization_scheme is not None:
+                self._by_scheme.setdefault(
+                    authenticator.authorization_scheme, (rank, authenticator))
+        if not self.authenticators:
+            raise ValueError('The authentication chain is empty')
+
+    def __getattr__(self, name: str):
+        """
+        Delegates scheme specific methods (e.g. `create_session`) to the
+        first authenticator of the chain that provides them.
+
+        Args:
+            name (str): The attribute name.
+
+        Raises:
+            AttributeError: If no authenticator provides the attribute.
+        """
+        if name.startswith('_'):
+            raise AttributeError(name)
+        for authenticator in self.__dict__.get('authenticators', []):
+            if hasattr(authenticator, name):
+                return getattr(authenticator, name)
+        raise AttributeError(name)
+
+    def select(self, authorization_header: Optional[str],
+               session_id: Optional[str]) -> Optional[Auth]:
+        """
+        Chooses the authenticator for the given credentials.
+
+        Args:
+            authorization_header (str): The Authorization header value.
+            session_id (str): The session cookie value.
+
+        Returns:
+            Auth: The chosen authenticator, or None if no configured
+            scheme applies.
+        """
+        candidate = None
+        if authorization_header is not None:
+            scheme = authorization_header.split(' ', 1)[0]
+            candidate = self._by_scheme.get(scheme)
+        if session_id is not None and self._by_cookie is not None:
+            if candidate is None or self._by_cookie[0] < candidate[0]:
+                candidate = self._by_cookie
+        return candidate[1] if candidate is not None else None
+
+    def user_from_credentials(
+            self, authorization_header: Optional[str],
+            session_id: Optional[str]) -> TypeVar('User'):
+        """
+        Resolves the user through the authenticator chosen by `select`.
+
+        Args:
+            authorization_header (str): The Authorization header value.
+            session_id (str): The session cookie value.
+
+        Returns:
+            TypeVar('User'): The user, or None if not authenticated.
+        """
+        return self._dispatch(authorization_header, session_id).user
+
+    def _dispatch(self, authorization_header: Optional[str],
+                  session_id: Optional[str]) -> AuthContext:
+        """
+        Authenticates credentials with the chosen authenticator and
+        counts the outcome per scheme.
+        """
+        has_credentials = \
+            authorization_header is not None or session_id is not None
+        authenticator = self.select(authorization_header, session_id)
+        if authenticator is None:
+            CHAIN_REQUESTS.inc(1, 'none', 'skipped')
+            return AuthContext(None, None, has_credentials)
+        user = authenticator.user_from_credentials(
+            authorization_header, session_id)
+        CHAIN_REQUESTS.inc(1, authenticator.scheme,
+                           'success' if user is not None else 'failure')
+        return AuthContext(user, authenticator.scheme, has_credentials)
+
+    def authenticate(self, request=None) -> AuthContext:
+        """
+        Reads the credentials of a request once and resolves its user
+        with a single authenticator.
+
+        Args:
+            request (object): The Flask request object. (optional)
+
+        Returns:
+            AuthContext: The authentication outcome of the request.
+        """
+        if request is None:
+            return AuthContext()
+        context = getattr(request, 'auth_context', None)
+        if context is None:
+            context = self._dispatch(self.authorization_header(request),
+                                     self.session_cookie(request))
+            request.auth_context = context
+        return context
+
+    def current_user(self, request=None) -> TypeVar('User'):
+        """
+        Retrieves the current user from the Flask request object.
+
+        Args:
+            request (object): The Flask request object. (optional)
+
+        Returns:
+            TypeVar('User'): The current user.
+        """
+        return self.authenticate(request).user
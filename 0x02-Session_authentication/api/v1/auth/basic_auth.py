@@ -5,9 +5,15 @@ This module provides `BasicAuth` class, which extends the `Auth` class
 and provides methods for basic authentication.
 """
 from api.v1.auth.auth import Auth
-import base64
+from api.v1.rate_limit import CLIENT_IP, check_email, check_ip
 from models.user import User
-from typing import TypeVar
+from os import getenv
+from typing import Optional, TypeVar
+import base64
+import binascii
+
+
+MAX_AUTHORIZATION_HEADER = int(getenv('MAX_AUTHORIZATION_HEADER', '1024'))
 
 
 class BasicAuth(Auth):
@@ -15,6 +21,8 @@ class BasicAuth(Auth):
     BasicAuth class extends the `Auth` class and provides methods for basic
     authentication.
     """
+    scheme = 'basic'
+    authorization_scheme = 'Basic'
 
     def extract_base64_authorization_header(
             self, authorization_header: str) -> str:
@@ -99,6 +107,51 @@ class BasicAuth(Auth):
         user_credentials = decoded_base64_authorization_header.split(':', 1)
         return user_credentials[0], user_credentials[1]
 
+    def parse_authorization_header(
+            self, authorization_header) -> (str, str):
+        """
+        Extracts the email and password of a Basic Authorization header in
+        one step, without the intermediate strings of the chained
+        extract/decode/split methods.
+
+        Args:
+            authorization_header (str | bytes): The raw header value.
+
+        Returns:
+            tuple: The email and the password, or (None, None) if the
+            header is missing, longer than MAX_AUTHORIZATION_HEADER, not a
+            Basic header, not canonical Base64 (alphabet and padding) or
+            without a ':' separator.
+        """
+        if isinstance(authorization_header, str):
+            if len(authorization_header) > MAX_AUTHORIZATION_HEADER \
+               or not authorization_header.startswith('Basic '):
+                return (None, None)
+            encoded = authorization_header[6:]
+        elif isinstance(authorization_header, (bytes, bytearray)):
+            if len(authorization_header) > MAX_AUTHORIZATION_HEADER \
+               or not authorization_header.startswith(b'Basic '):
+                return (None, None)
+            encoded = memoryview(authorization_header)[6:]
+        else:
+            return (None, None)
+        try:
+            decoded = binascii.a2b_base64(encoded)
+            canonical = binascii.b2a_base64(decoded, newline=False)
+            if isinstance(encoded, str):
+                encoded = encoded.encode('ascii')
+        except (binascii.Error, ValueError):
+            return (None, None)
+        if canonical != encoded:
+            return (None, None)
+        email, separator, password = decoded.partition(b':')
+        if not separator:
+            return (None, None)
+        try:
+            return email.decode('utf-8'), password.decode('utf-8')
+        except UnicodeDecodeError:
+            return (None, None)
+
     def user_object_from_credentials(
             self, user_email: str, user_pwd: str) -> TypeVar('User'):
         """
@@ -117,16 +170,25 @@ class BasicAuth(Auth):
                 - The database (file) does n't contain any User instance with
                   an email equal to `user_email`.
                 - `user_pwd` is not the password of the User instance found.
+
+        Raises:
+            RateLimitExceeded: If `user_email`, or the client IP of the
+            request (`CLIENT_IP`) before a password check, has no attempt
+            left.
         """
         if user_email is None or user_pwd is None:
             return None
         if not isinstance(user_email, str) or not isinstance(user_pwd, str):
             return None
 
+        check_email(user_email)
+        if not User.email_may_exist(user_email):
+            return None
         users = User.search({'email': user_email})
         if not users or users == []:
             return None
 
+        check_ip(CLIENT_IP.get())
         for user in users:
             if user.is_valid_password(user_pwd):
                 return user
@@ -140,15 +202,21 @@ class BasicAuth(Auth):
         if request is None:
             return None
 
-        auth_header = self.authorization_header(request)
-        base64_auth_header = \
-            self.extract_base64_authorization_header(auth_header)
-        decoded_auth_header = \
-            self.decode_base64_authorization_header(base64_auth_header)
-        user_credentials = self.extract_user_credentials(decoded_auth_header)
+        return self.user_from_credentials(
+            self.authorization_header(request), None)
 
-        if user_credentials:
-            email, password = user_credentials
-            return self.user_object_from_credentials(email, password)
+    def user_from_credentials(
+            self, authorization_header: Optional[str],
+            session_id: Optional[str]) -> TypeVar('User'):
+        """
+        Resolves the user from a Basic Authorization header value.
 
-        return None
+        Args:
+            authorization_header (str): The Authorization header value.
+            session_id (str): Unused by Basic authentication.
+
+        Returns:
+            TypeVar('User'): The user, or None if not authenticated.
+        """
+        email, password = self.parse_authorization_header(authorization_header)
+        return self.user_object_from_credentials(email, password)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+This module provides the `PathMatcher` class, which compiles the paths
+excluded from authentication into a character trie.
+"""
+from typing import Iterable
+
+
+class _Node:
+    """
+    A node of the path trie.
+    """
+    __slots__ = ('children', 'exact', 'prefix')
+
+    def __init__(self):
+        """
+        Initializes a node with no children and no rule ending on it.
+        """
+        self.children = {}
+        self.exact = False
+        self.prefix = False
+
+
+class PathMatcher:
+    """
+    PathMatcher decides whether a path matches one of the excluded paths
+    in O(len(path)), whatever the number of rules.
+
+    Rules have two forms:
+        - exact: `/api/v1/status` or `/api/v1/status/` matches the path
+          `/api/v1/status` with or without a trailing slash.
+        - wildcard: `/api/v1/stat*` matches every path starting with
+          `/api/v1/stat` (e.g. `/api/v1/stats`, `/api/v1/status/x`).
+    """
+
+    def __init__(self, rules: Iterable[str] = ()):
+        """
+        Compiles the given rules.
+
+        Args:
+            rules (Iterable[str]): The excluded paths.
+        """
+        self._root = _Node()
+        self.rules = []
+        for rule in rules:
+            self.add(rule)
+
+    def add(self, rule: str) -> None:
+        """
+        Adds one rule to the matcher. Empty rules are ignored.
+
+        Args:
+            rule (str): An exact path or a path ending with `*`.
+        """
+        rule = rule.strip()
+        if not rule:
+            return
+        is_prefix = rule.endswith('*')
+        if is_prefix:
+            rule = rule.rstrip('*')
+        elif not rule.endswith('/'):
+            rule += '/'
+        node = self._root
+        for char in rule:
+            child = node.children.get(char)
+            if child is None:
+                child = _Node()
+                node.children[char] = child
+            node = child
+        if is_prefix:
+            node.prefix = True
+        else:
+            node.exact = True
+        self.rules.append(rule + ('*' if is_prefix else ''))
+
+    def __len__(self) -> int:
+        """
+        Returns the number of rules.
+        """
+        return len(self.rules)
+
+    def match(self, path: str) -> bool:
+        """
+        Checks whether a path is matched by one of the rules.
+
+        Args:
+            path (str): The request path.
+
+        Returns:
+            bool: True if the path is excluded, otherwise False.
+        """
+        node = self._root
+        for char in path:
+            if node.prefix:
+                return True
+            node = node.children.get(char)
+            if node is None:
+                return False
+        if not path.endswith('/'):
+            if node.prefix:
+                return True
+            node = node.children.get('/')
+            if node is None:
+                return False
+        return node.exact or node.prefix
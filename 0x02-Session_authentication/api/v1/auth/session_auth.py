@@ -2,11 +2,31 @@
 """
 This module contains a SessionAuth class for implementing
 session-based authentication.
+
+Sessions last SESSION_DURATION seconds (0, the default, means forever) and
+are kept in the store selected by SESSION_STORE (see `session_store`).
+Expired sessions are evicted incrementally by the store, without scanning
+every session. Resolved users are cached per session in a bounded LRU
+cache (see `session_cache`). Memory sessions are snapshotted to
+SESSION_SNAPSHOT_PATH, when set, and reloaded on startup (see
+`session_snapshot`).
 """
 from api.v1.auth.auth import Auth
+from api.v1.auth.session_cache import build_session_user_cache
+from api.v1.auth.session_snapshot import build_snapshotter
+from api.v1.auth.session_store import (MemorySessionStore, SessionUserIds,
+                                       build_session_store)
+from api.v1.metrics import REGISTRY, CallbackMetric, Counter
 from models.user import User
+from os import getenv
 from typing import Optional
-import uuid
+import time
+
+
+SESSION_DURATION = int(getenv('SESSION_DURATION', '0') or 0)
+
+SESSIONS_EXPIRED = REGISTRY.register(Counter(
+    'sessions_expired_total', 'Sessions evicted after SESSION_DURATION.'))
 
 
 class SessionAuth(Auth):
@@ -15,8 +35,42 @@ class SessionAuth(Auth):
 
     This class inherits from the Auth class and serves as the starting point
     for implementing a new authentication mechanism based on sessions.
+
+    With the memory store, `user_id_by_session_id` is a live
+    {session_id: user_id} view of the sessions; it is None with the other
+    stores.
     """
-    user_id_by_session_id = {}
+    scheme = 'session'
+    store = build_session_store(SESSION_DURATION)
+    user_id_by_session_id = (SessionUserIds(store)
+                             if isinstance(store, MemorySessionStore)
+                             else None)
+    snapshotter = build_snapshotter(store)
+    user_cache = build_session_user_cache()
+    session_duration = SESSION_DURATION
+
+    def _touch(self) -> None:
+        """
+        Notifies the snapshotter, if any, that sessions changed.
+        """
+        if self.snapshotter is not None:
+            self.snapshotter.touch()
+
+    def evict_expired(self, now: float = None) -> int:
+        """
+        Evicts a bounded batch of expired sessions from the store.
+
+        Args:
+            now (float): The current time, `time.time()` by default.
+
+        Returns:
+            int: The number of sessions evicted.
+        """
+        evicted = self.store.evict_expired(time.time() if now is None
+                                           else now)
+        if evicted:
+            SESSIONS_EXPIRED.inc(evicted)
+        return evicted
 
     def create_session(self, user_id: str = None) -> str:
         """
@@ -33,8 +87,14 @@ class SessionAuth(Auth):
         """
         if user_id is None or not isinstance(user_id, str):
             return None
-        session_id = str(uuid.uuid4())
-        self.user_id_by_session_id[session_id] = user_id
+        now = time.time()
+        expires_at = None
+        if self.session_duration > 0:
+            expires_at = now + self.session_duration
+        session_id = self.store.new_session_id(user_id, expires_at)
+        self.store.set(session_id, user_id, expires_at)
+        self._touch()
+        self.evict_expired(now)
 
         return session_id
 
@@ -46,15 +106,74 @@ class SessionAuth(Auth):
             session_id (str): The session ID for which to retrieve the user ID.
 
         Returns:
-            str: The user ID associated with the session ID.
+            str: The user ID associated with the session ID, or None if
+            the session does not exist or has expired.
 
         Raises:
             None.
         """
+        entry = self._session_entry(session_id)
+        return entry[0] if entry is not None else None
+
+    def _session_entry(self, session_id: str, now: float = None):
+        """
+        Looks up an unexpired session in the store.
+
+        Returns:
+            tuple: The user ID and expiry of the session, or None.
+        """
         if session_id is None or not isinstance(session_id, str):
             return None
 
-        return self.user_id_by_session_id.get(session_id)
+        now = time.time() if now is None else now
+        self.evict_expired(now)
+        entry = self.store.get(session_id)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            return None
+        return entry
+
+    def destroy_session(self, request: Optional[object] = None) -> bool:
+        """
+        Deletes the session of a request (logout).
+
+        Args:
+            request (object): The request object containing the cookie value.
+
+        Returns:
+            bool: False if the request has no session cookie or its session
+            does not resolve to a user, True once the session is deleted.
+        """
+        if request is None:
+            return False
+        session_id = self.session_cookie(request)
+        if session_id is None:
+            return False
+        if self.user_id_for_session_id(session_id) is None:
+            return False
+        deleted = self.store.delete(session_id)
+        self.user_cache.invalidate_session(session_id)
+        self._touch()
+        return deleted
+
+    def destroy_all_sessions(self, user_id: str) -> int:
+        """
+        Deletes every session of a user (logout everywhere), in time
+        proportional to the number of sessions of that user.
+
+        Args:
+            user_id (str): The user ID.
+
+        Returns:
+            int: The number of sessions deleted.
+        """
+        if user_id is None or not isinstance(user_id, str):
+            return 0
+        deleted = self.store.delete_user(user_id)
+        self.user_cache.invalidate_user(user_id)
+        self._touch()
+        return deleted
 
     def current_user(self, request: Optional[object] = None) -> Optional[User]:
         """
@@ -69,9 +188,52 @@ class SessionAuth(Auth):
         Raises:
             None.
         """
-        session_id = self.session_cookie(request)
-        user_id = self.user_id_for_session_id(session_id)
-        if user_id is None:
+        return self.user_from_credentials(None, self.session_cookie(request))
+
+    def user_from_credentials(
+            self, authorization_header: Optional[str],
+            session_id: Optional[str]) -> Optional[User]:
+        """
+        Resolves the user from a session ID.
+
+        Args:
+            authorization_header (str): Unused by session authentication.
+            session_id (str): The session cookie value.
+
+        Returns:
+            Optional[User]: The user associated with the session ID.
+        """
+        if session_id is None or not isinstance(session_id, str):
+            return None
+        now = time.time()
+        user = self.user_cache.get(session_id, now)
+        if user is not None:
+            return user
+        entry = self._session_entry(session_id, now)
+        if entry is None:
             return None
 
-        return User.get(user_id)
+        user = User.get(entry[0])
+        if user is not None:
+            self.user_cache.put(session_id, user, entry[1], now)
+        return user
+
+
+User.add_listener(SessionAuth.user_cache.on_user_event)
+
+REGISTRY.register(CallbackMetric(
+    'session_map_size', 'Number of sessions held by SessionAuth.',
+    lambda: len(SessionAuth.store)))
+REGISTRY.register(CallbackMetric(
+    'session_user_cache_size', 'Entries of the session -> user cache.',
+    lambda: len(SessionAuth.user_cache)))
+REGISTRY.register(CallbackMetric(
+    'session_user_cache_hits_total', 'Session -> user cache hits.',
+    lambda: SessionAuth.user_cache.hits, 'counter'))
+REGISTRY.register(CallbackMetric(
+    'session_user_cache_misses_total', 'Session -> user cache misses.',
+    lambda: SessionAuth.user_cache.misses, 'counter'))
+REGISTRY.register(CallbackMetric(
+    'session_user_cache_evictions_total',
+    'Session -> user cache entries evicted by the size limit.',
+    lambda: SessionAuth.user_cache.evictions, 'counter'))
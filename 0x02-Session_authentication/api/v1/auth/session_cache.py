@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+This module provides `SessionUserCache`, a bounded LRU cache of the users
+resolved from session IDs, so a session lookup in a shared store and the
+`User.get` that follows are skipped for active sessions.
+"""
+from collections import OrderedDict
+from os import getenv
+from threading import Lock
+from typing import Optional, TypeVar
+import os
+import time
+
+
+class SessionUserCache:
+    """
+    SessionUserCache maps session IDs to users, with at most `max_size`
+    entries (least recently used evicted first), each trusted for at most
+    `ttl` seconds and never past the expiry of its session.
+
+    A reverse index of the cached session IDs of each user makes the
+    invalidation of a user cost the number of its cached sessions.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 60.0):
+        """
+        Initializes an empty cache.
+
+        Args:
+            max_size (int): The maximum number of entries; 0 disables the
+            cache.
+            ttl (float): Seconds an entry is trusted.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._sessions_by_user = {}
+        self._lock = Lock()
+        os.register_at_fork(after_in_child=self._reinit)
+
+    def _reinit(self) -> None:
+        """
+        Replaces the lock inherited by a freshly forked process.
+        """
+        self._lock = Lock()
+
+    def _unlink(self, session_id: str) -> None:
+        """
+        Removes an entry and its reverse index link. The lock must be held.
+        """
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return
+        user_sessions = self._sessions_by_user.get(entry[0].id)
+        if user_sessions is not None:
+            user_sessions.discard(session_id)
+            if not user_sessions:
+                del self._sessions_by_user[entry[0].id]
+
+    def get(self, session_id: str,
+            now: float = None) -> Optional[TypeVar('User')]:
+        """
+        Returns the cached user of a session, or None on a miss.
+
+        Args:
+            session_id (str): The session ID.
+            now (float): The current time, `time.time()` by default.
+        """
+        if self.max_size <= 0:
+            return None
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[1] <= now:
+                self._unlink(session_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, session_id: str, user: TypeVar('User'),
+            expires_at: Optional[float], now: float = None) -> None:
+        """
+        Caches the user of a session.
+
+        Args:
+            session_id (str): The session ID.
+            user (User): The user of the session.
+            expires_at (float): The session expiry, or None.
+            now (float): The current time, `time.time()` by default.
+        """
+        if self.max_size <= 0:
+            return
+        now = time.time() if now is None else now
+        valid_until = now + self.ttl
+        if expires_at is not None:
+            valid_until = min(valid_until, expires_at)
+        with self._lock:
+            self._unlink(session_id)
+            self._entries[session_id] = (user, valid_until)
+            self._sessions_by_user.setdefault(user.id, set()).add(session_id)
+            while len(self._entries) > self.max_size:
+                self._unlink(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_session(self, session_id: str) -> None:
+        """
+        Drops the entry of a session.
+        """
+        with self._lock:
+            self._unlink(session_id)
+
+    def invalidate_user(self, user_id: str) -> None:
+        """
+        Drops the entries of every session of a user.
+        """
+        with self._lock:
+            for session_id in self._sessions_by_user.pop(user_id, ()):
+                self._entries.pop(session_id, None)
+
+    def clear(self) -> None:
+        """
+        Drops every entry.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._sessions_by_user.clear()
+
+    def on_user_event(self, event: str, user: TypeVar('User')) -> None:
+        """
+        `Base` listener: invalidates a saved or removed user, and clears
+        the cache when the users are reloaded.
+        """
+        if user is None:
+            self.clear()
+        else:
+            self.invalidate_user(user.id)
+
+    def __len__(self) -> int:
+        """
+        Returns the number of entries.
+        """
+        return len(self._entries)
+
+
+def build_session_user_cache() -> SessionUserCache:
+    """
+    Builds the cache configured by SESSION_USER_CACHE_SIZE (default 10000,
+    0 disables it) and SESSION_USER_CACHE_TTL (seconds, default 10).
+    """
+    return SessionUserCache(
+        int(getenv('SESSION_USER_CACHE_SIZE', '10000')),
+        float(getenv('SESSION_USER_CACHE_TTL', '10')))
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+This module saves the sessions of a `MemorySessionStore` to disk so a
+restarted process resumes them instead of making every user log in again.
+
+Each process writes its own snapshot, `<path>-<pid>`, from a background
+thread, at most every `interval` seconds and only when sessions changed,
+plus once more at exit. Besides its sessions, a snapshot lists the loaded
+sessions that are gone from the store (logged out or revoked), since they
+are still in the main snapshot and in those of the other processes. On
+startup, `load` merges the main snapshot and the per-process ones, drops
+the removed and expired sessions, writes the result back as `<path>` and
+removes the per-process files.
+
+A snapshot is a small header followed by one record per session, then the
+IDs of the removed sessions:
+
+    header:  b'SSN2', written at (float64), session count (uint32)
+    record:  expiry (float64, NaN for none), session ID length (uint16),
+             session ID, user ID length (uint16), user ID
+    removed: count (uint32), then per session: ID length (uint16), ID
+
+All numbers are little-endian; IDs are UTF-8.
+"""
+from api.v1.auth.session_store import MemorySessionStore
+from threading import Event, Lock, Thread
+from typing import Iterable, Set, Tuple
+import atexit
+import glob
+import math
+import os
+import struct
+import time
+
+
+MAGIC = b'SSN2'
+HEADER = struct.Struct('<4sdI')
+COUNT = struct.Struct('<I')
+EXPIRY = struct.Struct('<d')
+LENGTH = struct.Struct('<H')
+
+
+def dump_sessions(sessions: dict, removed: Iterable[str] = ()) -> bytes:
+    """
+    Encodes a session map {session_id: (user_id, expires_at)}.
+
+    Args:
+        sessions (dict): The sessions.
+        removed (iterable): The IDs of the removed sessions.
+
+    Returns:
+        bytes: The snapshot.
+    """
+    parts = [HEADER.pack(MAGIC, time.time(), len(sessions))]
+    for session_id, (user_id, expires_at) in sessions.items():
+        session_bytes = session_id.encode()
+        user_bytes = user_id.encode()
+        parts.append(EXPIRY.pack(math.nan if expires_at is None
+                                 else expires_at))
+        parts.append(LENGTH.pack(len(session_bytes)))
+        parts.append(session_bytes)
+        parts.append(LENGTH.pack(len(user_bytes)))
+        parts.append(user_bytes)
+    removed = [session_id.encode() for session_id in removed]
+    parts.append(COUNT.pack(len(removed)))
+    for session_bytes in removed:
+        parts.append(LENGTH.pack(len(session_bytes)))
+        parts.append(session_bytes)
+    return b''.join(parts)
+
+
+def load_sessions(data: bytes,
+                  now: float = None) -> Tuple[dict, Set[str]]:
+    """
+    Decodes a snapshot, skipping the sessions expired at `now`.
+
+    Args:
+        data (bytes): The snapshot.
+        now (float): The current time, `time.time()` by default.
+
+    Returns:
+        tuple: The sessions {session_id: (user_id, expires_at)} and the
+        set of the IDs of the removed sessions.
+
+    Raises:
+        ValueError: If the data is not a valid snapshot.
+    """
+    now = time.time() if now is None else now
+    view = memoryview(data)
+    try:
+        magic, _, count = HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError('Not a session snapshot')
+        offset = HEADER.size
+        sessions = {}
+        for _ in range(count):
+            expires_at, = EXPIRY.unpack_from(view, offset)
+            offset += EXPIRY.size
+            length, = LENGTH.unpack_from(view, offset)
+            offset += LENGTH.size
+            session_id = bytes(view[offset:offset + length]).decode()
+            offset += length
+            length, = LENGTH.unpack_from(view, offset)
+            offset += LENGTH.size
+            user_id = bytes(view[offset:offset + length]).decode()
+            offset += length
+            if math.isnan(expires_at):
+                sessions[session_id] = (user_id, None)
+            elif expires_at > now:
+                sessions[session_id] = (user_id, expires_at)
+        count, = COUNT.unpack_from(view, offset)
+        offset += COUNT.size
+        removed = set()
+        for _ in range(count):
+            length, = LENGTH.unpack_from(view, offset)
+            offset += LENGTH.size
+            removed.add(bytes(view[offset:offset + length]).decode())
+            offset += length
+    except (struct.error, UnicodeDecodeError) as e:
+        raise ValueError('Truncated session snapshot') from e
+    return sessions, removed
+
+
+def write_atomically(path: str, data: bytes) -> None:
+    """
+    Replaces `path` with `data`, so readers never see a partial file.
+    """
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class SessionSnapshotter:
+    """
+    SessionSnapshotter periodically snapshots a `MemorySessionStore`.
+
+    The snapshot thread of a process is started by the first `touch`
+    (a session change) in that process, so a preloading master that never
+    serves requests does not write snapshots.
+
+    `loaded` holds the IDs of the sessions read by `load` (inherited by
+    forked workers); those missing from the store when a snapshot is taken
+    are written as removed.
+    """
+
+    def __init__(self, store: MemorySessionStore, path: str,
+                 interval: float = 30.0):
+        """
+        Initializes the snapshotter.
+
+        Args:
+            store (MemorySessionStore): The store to snapshot.
+            path (str): The main snapshot file.
+            interval (float): Minimum seconds between two snapshots.
+        """
+        self.store = store
+        self.path = path
+        self.interval = interval
+        self.loaded = frozenset()
+        self._dirty = False
+        self._pid = None
+        self._stop = Event()
+        self._lock = Lock()
+        os.register_at_fork(after_in_child=self._reinit)
+        atexit.register(self.stop)
+
+    def _reinit(self) -> None:
+        """
+        Forgets the snapshot thread of the parent in a forked process.
+        """
+        self._dirty = False
+        self._pid = None
+        self._stop = Event()
+        self._lock = Lock()
+
+    @property
+    def process_path(self) -> str:
+        """
+        Returns the snapshot file of the current process.
+        """
+        return '{}-{}'.format(self.path, os.getpid())
+
+    def load(self) -> int:
+        """
+        Merges the main and per-process snapshots into the store, without
+        the sessions any of them lists as removed, then rewrites the main
+        snapshot and removes the per-process ones.
+
+        Returns:
+            int: The number of sessions loaded.
+        """
+        paths = [self.path] + sorted(glob.glob('{}-[0-9]*'.format(
+            glob.escape(self.path))))
+        paths = [p for p in paths if not p.endswith('.tmp')]
+        sessions = {}
+        removed = set()
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    path_sessions, path_removed = load_sessions(f.read())
+            except (OSError, ValueError):
+                continue
+            sessions.update(path_sessions)
+            removed |= path_removed
+        for session_id in removed:
+            sessions.pop(session_id, None)
+        self.loaded = frozenset(sessions)
+        for session_id, (user_id, expires_at) in sessions.items():
+            self.store.set(session_id, user_id, expires_at)
+        write_atomically(self.path, dump_sessions(sessions))
+        for path in paths[1:]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return len(sessions)
+
+    def touch(self) -> None:
+        """
+        Records that sessions changed, starting the snapshot thread of
+        this process if needed.
+        """
+        self._dirty = True
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    Thread(target=self._run, name='session-snapshot',
+                           daemon=True).start()
+
+    def snapshot(self) -> None:
+        """
+        Writes the snapshot of this process if sessions changed since the
+        last one, with the loaded sessions that are no longer in the store
+        as removed. The session map is copied at once, then encoded and
+        written outside of any lock taken by request threads.
+        """
+        if not self._dirty:
+            return
+        self._dirty = False
+        sessions = self.store.sessions.copy()
+        removed = self.loaded.difference(sessions)
+        write_atomically(self.process_path, dump_sessions(sessions, removed))
+
+    def _run(self) -> None:
+        """
+        Body of the snapshot thread.
+        """
+        stop = self._stop
+        while not stop.wait(self.interval):
+            self.snapshot()
+
+    def stop(self) -> None:
+        """
+        Stops the snapshot thread and writes a final snapshot (graceful
+        shutdown).
+        """
+        self._stop.set()
+        if self._pid == os.getpid():
+            self.snapshot()
+
+
+def build_snapshotter(store) -> SessionSnapshotter:
+    """
+    Builds the snapshotter of a memory session store when
+    SESSION_SNAPSHOT_PATH is set, with SESSION_SNAPSHOT_INTERVAL seconds
+    (default 30) between snapshots.
+
+    Returns:
+        SessionSnapshotter: The snapshotter, or None.
+    """
+    path = os.getenv('SESSION_SNAPSHOT_PATH')
+    if not path or not isinstance(store, MemorySessionStore):
+        return None
+    return SessionSnapshotter(
+        store, path, float(os.getenv('SESSION_SNAPSHOT_INTERVAL', '30')))
@@ -0,0 +1,699 @@
+#!/usr/bin/env python3
+"""
+This module provides the session stores of `SessionAuth`.
+
+`MemorySessionStore` keeps the sessions of one process in a dict, with a
+min-heap ordered by expiry for incremental eviction. `SQLiteSessionStore`
+keeps them in a local SQLite file shared by all the worker processes of a
+host, behind a small per-process read-through cache. `SignedSessionStore`
+keeps nothing but a small revocation list, shared through a SQLite file:
+the session ID is a token carrying the user ID and expiry, authenticated
+with HMAC.
+"""
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from os import getenv
+from threading import Lock
+from typing import Dict, Optional, Tuple
+import base64
+import heapq
+import hmac
+import os
+import sqlite3
+import time
+import uuid
+
+
+SESSION_EVICTION_BATCH = int(getenv('SESSION_EVICTION_BATCH', '16'))
+
+
+class SessionStore:
+    """
+    SessionStore is the interface of the session stores. A session is a
+    user ID and an expiry timestamp (None for no expiry).
+    """
+
+    def new_session_id(self, user_id: str,
+                       expires_at: Optional[float]) -> str:
+        """
+        Generates the ID of a new session, a random UUID by default.
+        """
+        return str(uuid.uuid4())
+
+    def set(self, session_id: str, user_id: str,
+            expires_at: Optional[float]) -> None:
+        """
+        Stores a session.
+
+        Args:
+            session_id (str): The session ID.
+            user_id (str): The ID of the user of the session.
+            expires_at (float): The expiry as a Unix timestamp, or None.
+        """
+        raise NotImplementedError
+
+    def get(self, session_id: str) -> Optional[Tuple[str, Optional[float]]]:
+        """
+        Returns the user ID and expiry of a session, or None if the
+        session is unknown. Expired sessions may still be returned.
+        """
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> bool:
+        """
+        Deletes a session.
+
+        Returns:
+            bool: Whether the session existed.
+        """
+        raise NotImplementedError
+
+    def delete_user(self, user_id: str) -> int:
+        """
+        Deletes every session of a user, in time proportional to the
+        number of sessions of that user.
+
+        Returns:
+            int: The number of sessions deleted.
+        """
+        raise NotImplementedError
+
+    def evict_expired(self, now: float,
+                      limit: int = SESSION_EVICTION_BATCH) -> int:
+        """
+        Evicts at most `limit` sessions expired at `now`.
+
+        Returns:
+            int: The number of sessions evicted.
+        """
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        """
+        Returns the number of sessions stored.
+        """
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """
+    MemorySessionStore keeps the sessions of this process in a dict, with
+    a reverse index of the session IDs of each user.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty store.
+        """
+        self.sessions = {}
+        self.sessions_by_user = {}
+        self._expiry_heap = []
+        self._lock = Lock()
+        os.register_at_fork(after_in_child=self._reinit)
+
+    def _reinit(self) -> None:
+        """
+        Replaces the lock inherited by a freshly forked process.
+        """
+        self._lock = Lock()
+
+    def set(self, session_id: str, user_id: str,
+            expires_at: Optional[float]) -> None:
+        """
+        Stores a session.
+        """
+        with self._lock:
+            self._unlink(session_id)
+            self.sessions[session_id] = (user_id, expires_at)
+            self.sessions_by_user.setdefault(user_id, set()).add(session_id)
+            if expires_at is not None:
+                heapq.heappush(self._expiry_heap, (expires_at, session_id))
+
+    def get(self, session_id: str) -> Optional[Tuple[str, Optional[float]]]:
+        """
+        Returns the user ID and expiry of a session.
+        """
+        return self.sessions.get(session_id)
+
+    def _unlink(self, session_id: str) -> bool:
+        """
+        Removes a session from the map and the reverse index. The lock
+        must be held.
+        """
+        entry = self.sessions.pop(session_id, None)
+        if entry is None:
+            return False
+        user_sessions = self.sessions_by_user.get(entry[0])
+        if user_sessions is not None:
+            user_sessions.discard(session_id)
+            if not user_sessions:
+                del self.sessions_by_user[entry[0]]
+        return True
+
+    def delete(self, session_id: str) -> bool:
+        """
+        Deletes a session; its heap entry is skipped when popped.
+        """
+        with self._lock:
+            return self._unlink(session_id)
+
+    def delete_user(self, user_id: str) -> int:
+        """
+        Deletes every session of a user through the reverse index.
+        """
+        with self._lock:
+            session_ids = self.sessions_by_user.pop(user_id, ())
+            for session_id in session_ids:
+                self.sessions.pop(session_id, None)
+            return len(session_ids)
+
+    def evict_expired(self, now: float,
+                      limit: int = SESSION_EVICTION_BATCH) -> int:
+        """
+        Pops at most `limit` heap entries expired at `now`, soonest expiry
+        first. Entries of sessions that were deleted or replaced are
+        skipped, so the session map is never scanned.
+        """
+        heap = self._expiry_heap
+        if not heap or heap[0][0] > now:
+            return 0
+        evicted = 0
+        with self._lock:
+            while heap and limit > 0 and heap[0][0] <= now:
+                expires_at, session_id = heapq.heappop(heap)
+                limit -= 1
+                entry = self.sessions.get(session_id)
+                if entry is not None and entry[1] == expires_at:
+                    self._unlink(session_id)
+                    evicted += 1
+        return evicted
+
+    def __len__(self) -> int:
+        """
+        Returns the number of sessions stored.
+        """
+        return len(self.sessions)
+
+
+class SessionUserIds(MutableMapping):
+    """
+    SessionUserIds is a live {session_id: user_id} view of the sessions of
+    a `MemorySessionStore`, exposed as `SessionAuth.user_id_by_session_id`
+    for the code written against the original session dict. Sessions set
+    through it never expire.
+    """
+
+    def __init__(self, store: MemorySessionStore):
+        """
+        Initializes the view of a store.
+        """
+        self.store = store
+
+    def __getitem__(self, session_id: str) -> str:
+        """
+        Returns the user ID of a session.
+        """
+        return self.store.sessions[session_id][0]
+
+    def __setitem__(self, session_id: str, user_id: str) -> None:
+        """
+        Stores a session without expiry.
+        """
+        self.store.set(session_id, user_id, None)
+
+    def __delitem__(self, session_id: str) -> None:
+        """
+        Deletes a session.
+        """
+        if not self.store.delete(session_id):
+            raise KeyError(session_id)
+
+    def __iter__(self):
+        """
+        Iterates over a copy of the session IDs.
+        """
+        return iter(list(self.store.sessions))
+
+    def __len__(self) -> int:
+        """
+        Returns the number of sessions.
+        """
+        return len(self.store)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLiteSessionStore keeps the sessions in a SQLite file, so the worker
+    processes of a host share them.
+
+    Lookups go through a per-process LRU cache of at most `cache_size`
+    entries kept `cache_ttl` seconds: a session deleted by another
+    process may still resolve here for up to `cache_ttl` seconds.
+    Sessions are indexed by user, so revoking the sessions of a user
+    does not scan the table.
+    """
+
+    def __init__(self, path: str, cache_size: int = 1024,
+                 cache_ttl: float = 5.0, eviction_interval: float = 1.0):
+        """
+        Initializes the store.
+
+        Args:
+            path (str): The SQLite database file.
+            cache_size (int): The maximum number of cached sessions; 0
+            disables the cache.
+            cache_ttl (float): Seconds a cached session is trusted.
+            eviction_interval (float): Minimum seconds between two
+            evictions of expired sessions by this process.
+        """
+        self.path = path
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.eviction_interval = eviction_interval
+        self._cache = OrderedDict()
+        self._next_eviction = 0.0
+        self._conn = None
+        self._lock = Lock()
+        os.register_at_fork(after_in_child=self._reinit)
+
+    def _reinit(self) -> None:
+        """
+        Drops the connection, lock and cache inherited by a freshly forked
+        process; SQLite connections must not cross a fork.
+        """
+        self._conn = None
+        self._lock = Lock()
+        self._cache = OrderedDict()
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Returns the connection of the current process, opening it on
+        first use. The lock must be held.
+        """
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=5,
+                                         isolation_level=None,
+                                         check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS sessions (session_id TEXT'
+                ' PRIMARY KEY, user_id TEXT NOT NULL, expires_at REAL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS sessions_expiry'
+                               ' ON sessions (expires_at)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS sessions_user'
+                               ' ON sessions (user_id)')
+        return self._conn
+
+    def _cache_put(self, session_id: str, entry: tuple) -> None:
+        """
+        Caches a session entry. The lock must be held.
+        """
+        if self.cache_size <= 0:
+            return
+        self._cache[session_id] = (entry, time.monotonic() + self.cache_ttl)
+        self._cache.move_to_end(session_id)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def set(self, session_id: str, user_id: str,
+            expires_at: Optional[float]) -> None:
+        """
+        Stores a session.
+        """
+        with self._lock:
+            self._connection().execute(
+                'INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)',
+                (session_id, user_id, expires_at))
+            self._cache_put(session_id, (user_id, expires_at))
+
+    def get(self, session_id: str) -> Optional[Tuple[str, Optional[float]]]:
+        """
+        Returns the user ID and expiry of a session, from the cache when
+        it is fresh enough.
+        """
+        with self._lock:
+            cached = self._cache.get(session_id)
+            if cached is not None:
+                if cached[1] > time.monotonic():
+                    self._cache.move_to_end(session_id)
+                    return cached[0]
+                del self._cache[session_id]
+            row = self._connection().execute(
+                'SELECT user_id, expires_at FROM sessions'
+                ' WHERE session_id = ?', (session_id,)).fetchone()
+            if row is None:
+                return None
+            entry = (row[0], row[1])
+            self._cache_put(session_id, entry)
+            return entry
+
+    def delete(self, session_id: str) -> bool:
+        """
+        Deletes a session.
+        """
+        with self._lock:
+            self._cache.pop(session_id, None)
+            return self._connection().execute(
+                'DELETE FROM sessions WHERE session_id = ?',
+                (session_id,)).rowcount > 0
+
+    def delete_user(self, user_id: str) -> int:
+        """
+        Deletes every session of a user, found through the user index.
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(
+                    'SELECT session_id FROM sessions WHERE user_id = ?',
+                    (user_id,)).fetchall()
+                conn.execute('DELETE FROM sessions WHERE user_id = ?',
+                             (user_id,))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            for row in rows:
+                self._cache.pop(row[0], None)
+            return len(rows)
+
+    def evict_expired(self, now: float, limit: int = 1000) -> int:
+        """
+        Deletes at most `limit` expired sessions, using the expiry index,
+        at most once every `eviction_interval` seconds per process.
+        """
+        if now < self._next_eviction:
+            return 0
+        with self._lock:
+            self._next_eviction = now + self.eviction_interval
+            cursor = self._connection().execute(
+                'DELETE FROM sessions WHERE rowid IN (SELECT rowid FROM'
+                ' sessions WHERE expires_at <= ? ORDER BY expires_at'
+                ' LIMIT ?)', (now, limit))
+            return cursor.rowcount
+
+    def __len__(self) -> int:
+        """
+        Returns the number of sessions stored.
+        """
+        with self._lock:
+            return self._connection().execute(
+                'SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+
+class SignedSessionStore(SessionStore):
+    """
+    SignedSessionStore issues self-contained session tokens:
+
+        <key id>.<user id>.<issued ms>.<expiry s>.<nonce>.<HMAC-SHA256>
+
+    Validating a token is pure CPU and needs no shared state, so any worker
+    of any host holding the keys accepts it. Several keys can be active at
+    once: tokens are signed with the first one and verified with the one
+    named by their key id, so keys can be rotated without logging users
+    out.
+
+    Forced logouts (single tokens, and all the tokens of a user issued
+    before a given time) are appended to the `revocations` table of a
+    SQLite file shared by the workers of a host, and mirrored in memory:
+    each process reads the new rows at most every `sync_interval` seconds,
+    so a revocation reaches the other workers within that delay. Tokens
+    always expire, and revocations are pruned once the revoked tokens
+    would have expired anyway.
+    """
+
+    def __init__(self, keys: Dict[str, bytes], duration: float, path: str,
+                 sync_interval: float = 1.0):
+        """
+        Initializes the store.
+
+        Args:
+            keys (dict): The signing keys by key id, the first one being
+            used to sign new tokens.
+            duration (float): The session lifetime in seconds.
+            path (str): The SQLite database file of the revocations.
+            sync_interval (float): Maximum seconds before a revocation made
+            by another process applies to this one.
+
+        Raises:
+            ValueError: If no key is given, a key id contains a dot or the
+            duration is not positive.
+        """
+        if not keys:
+            raise ValueError("SignedSessionStore needs at least one key")
+        if any('.' in key_id for key_id in keys):
+            raise ValueError("Key ids must not contain '.'")
+        if not duration or duration <= 0:
+            raise ValueError(
+                "SignedSessionStore needs a positive SESSION_DURATION")
+        self.keys = dict(keys)
+        self.signing_key_id = next(iter(self.keys))
+        self.duration = duration
+        self.path = path
+        self.sync_interval = sync_interval
+        self.revoked = {}
+        self.revoked_users = {}
+        self._revocation_heap = []
+        self._last_row = 0
+        self._next_sync = 0.0
+        self._conn = None
+        self._lock = Lock()
+        os.register_at_fork(after_in_child=self._reinit)
+
+    def _reinit(self) -> None:
+        """
+        Drops the connection and lock inherited by a freshly forked
+        process; SQLite connections must not cross a fork.
+        """
+        self._conn = None
+        self._lock = Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Returns the connection of the current process, opening it on
+        first use. The lock must be held.
+        """
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=5,
+                                         isolation_level=None,
+                                         check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS revocations (id INTEGER PRIMARY'
+                ' KEY AUTOINCREMENT, kind TEXT NOT NULL, key TEXT NOT NULL,'
+                ' revoked_at INTEGER NOT NULL, expires_at REAL NOT NULL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS revocations_expiry'
+                               ' ON revocations (expires_at)')
+        return self._conn
+
+    def _apply(self, kind: str, key: str, revoked_at: int,
+               expires_at: float) -> None:
+        """
+        Records a revocation in memory. The lock must be held.
+        """
+        if kind == 'token':
+            if key in self.revoked:
+                return
+            self.revoked[key] = expires_at
+        elif revoked_at > self.revoked_users.get(key, -1):
+            self.revoked_users[key] = revoked_at
+        else:
+            return
+        heapq.heappush(self._revocation_heap, (expires_at, kind, key))
+
+    def _revoke(self, kind: str, key: str, revoked_at: int,
+                expires_at: float) -> None:
+        """
+        Stores a revocation for every process and applies it here at once.
+        """
+        with self._lock:
+            self._connection().execute(
+                'INSERT INTO revocations (kind, key, revoked_at, expires_at)'
+                ' VALUES (?, ?, ?, ?)', (kind, key, revoked_at, expires_at))
+            self._apply(kind, key, revoked_at, expires_at)
+
+    def _sync(self) -> None:
+        """
+        Applies the revocations stored since the last sync, at most once
+        every `sync_interval` seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_sync:
+                return
+            self._next_sync = now + self.sync_interval
+            rows = self._connection().execute(
+                'SELECT id, kind, key, revoked_at, expires_at FROM'
+                ' revocations WHERE id > ? ORDER BY id',
+                (self._last_row,)).fetchall()
+            for row in rows:
+                self._apply(*row[1:])
+            if rows:
+                self._last_row = rows[-1][0]
+
+    @staticmethod
+    def _mac(key: bytes, message: str) -> str:
+        """
+        Returns the URL-safe Base64 HMAC-SHA256 of a message.
+        """
+        digest = hmac.digest(key, message.encode(), 'sha256')
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+    def new_session_id(self, user_id: str,
+                       expires_at: Optional[float]) -> str:
+        """
+        Issues a token signed with the current signing key, expiring after
+        the session duration if no expiry is given.
+        """
+        now = time.time()
+        if expires_at is None:
+            expires_at = now + self.duration
+        message = '{}.{}.{:x}.{:x}.{}'.format(
+            self.signing_key_id, user_id, int(now * 1000), int(expires_at),
+            os.urandom(6).hex())
+        return '{}.{}'.format(
+            message, self._mac(self.keys[self.signing_key_id], message))
+
+    def _parse(self, session_id: str) -> Optional[Tuple[str, int, int]]:
+        """
+        Verifies a token.
+
+        Returns:
+            tuple: The user ID, issue time (ms) and expiry (s), or None if
+            the token is malformed, its signature is wrong or it has no
+            expiry.
+        """
+        parts = session_id.split('.')
+        if len(parts) != 6:
+            return None
+        key = self.keys.get(parts[0])
+        if key is None:
+            return None
+        message = session_id[:session_id.rindex('.')]
+        if not hmac.compare_digest(self._mac(key, message), parts[5]):
+            return None
+        try:
+            expires_at = int(parts[3], 16)
+            if expires_at <= 0:
+                return None
+            return parts[1], int(parts[2], 16), expires_at
+        except ValueError:
+            return None
+
+    def set(self, session_id: str, user_id: str,
+            expires_at: Optional[float]) -> None:
+        """
+        Does nothing: the token carries the session.
+        """
+
+    def get(self, session_id: str) -> Optional[Tuple[str, Optional[float]]]:
+        """
+        Returns the user ID and expiry of a valid, unrevoked token.
+        """
+        parsed = self._parse(session_id)
+        if parsed is None:
+            return None
+        if time.monotonic() >= self._next_sync:
+            self._sync()
+        user_id, issued_ms, expires_at = parsed
+        if session_id in self.revoked:
+            return None
+        revoked_at = self.revoked_users.get(user_id)
+        if revoked_at is not None and issued_ms <= revoked_at:
+            return None
+        return user_id, expires_at
+
+    def delete(self, session_id: str) -> bool:
+        """
+        Revokes a valid token until it expires.
+        """
+        parsed = self._parse(session_id)
+        if parsed is None:
+            return False
+        self._revoke('token', session_id, 0, parsed[2])
+        return True
+
+    def delete_user(self, user_id: str) -> int:
+        """
+        Revokes every token of a user issued until now. The number of
+        tokens is unknown, so 0 is returned.
+        """
+        revoked_at = int(time.time() * 1000)
+        self._revoke('user', user_id, revoked_at,
+                     revoked_at / 1000 + self.duration)
+        return 0
+
+    def evict_expired(self, now: float,
+                      limit: int = SESSION_EVICTION_BATCH) -> int:
+        """
+        Prunes at most `limit` revocations whose tokens have expired, in
+        memory and in the shared table.
+        """
+        heap = self._revocation_heap
+        if not heap or heap[0][0] > now:
+            return 0
+        evicted = 0
+        with self._lock:
+            while heap and limit > 0 and heap[0][0] <= now:
+                expires_at, kind, key = heapq.heappop(heap)
+                limit -= 1
+                if kind == 'token':
+                    self.revoked.pop(key, None)
+                else:
+                    revoked_at = self.revoked_users.get(key)
+                    if revoked_at is not None and \
+                            revoked_at / 1000 + self.duration <= now:
+                        self.revoked_users.pop(key, None)
+                evicted += 1
+            self._connection().execute(
+                'DELETE FROM revocations WHERE expires_at <= ?', (now,))
+        return evicted
+
+    def __len__(self) -> int:
+        """
+        Returns the number of revocations kept; sessions are not stored.
+        """
+        return len(self.revoked) + len(self.revoked_users)
+
+
+def parse_signing_keys(value: str) -> Dict[str, bytes]:
+    """
+    Parses SESSION_SIGNING_KEYS: comma separated `key_id:secret` pairs,
+    the first one signing new tokens.
+    """
+    keys = {}
+    for item in value.split(','):
+        key_id, _, secret = item.strip().partition(':')
+        if key_id and secret:
+            keys[key_id] = secret.encode()
+    return keys
+
+
+def build_session_store(duration: float = 0) -> SessionStore:
+    """
+    Builds the session store selected by SESSION_STORE: 'memory' (the
+    default), 'sqlite' with the file given by SESSION_DB, or 'signed'
+    with the keys given by SESSION_SIGNING_KEYS and the revocations kept
+    in SESSION_DB, read every SESSION_REVOCATION_SYNC seconds (default 1).
+
+    Args:
+        duration (float): The session lifetime in seconds, 0 for none.
+
+    Raises:
+        ValueError: If the signed store is selected without a duration.
+    """
+    store = getenv('SESSION_STORE', 'memory')
+    if store == 'sqlite':
+        return SQLiteSessionStore(
+            getenv('SESSION_DB', '.sessions.db'),
+            int(getenv('SESSION_CACHE_SIZE', '1024')),
+            float(getenv('SESSION_CACHE_TTL', '5')))
+    if store == 'signed':
+        return SignedSessionStore(
+            parse_signing_keys(getenv('SESSION_SIGNING_KEYS', '')), duration,
+            getenv('SESSION_DB', '.sessions.db'),
+            float(getenv('SESSION_REVOCATION_SYNC', '1')))
+    return MemorySessionStore()
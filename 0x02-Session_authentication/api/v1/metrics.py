@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+This module provides a small in-process metrics registry for the API and
+renders it in the Prometheus text exposition format.
+"""
+from models.base import STATS
+from models.user import User
+from threading import Lock
+from typing import Callable, Dict, List, Tuple
+import os
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    """
+    Formats label names and values as a Prometheus label set.
+
+    Args:
+        names (tuple): The label names.
+        values (tuple): The label values, in the same order.
+
+    Returns:
+        str: The label set, e.g. `{route="/x",method="GET"}`, or an empty
+        string when there are no labels.
+    """
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+        pairs.append('{}="{}"'.format(name, value))
+    return '{' + ','.join(pairs) + '}'
+
+
+class Metric:
+    """
+    Metric is the base class of all metrics kept by the registry.
+    """
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str,
+                 labels: Tuple[str, ...] = ()):
+        """
+        Initializes a metric.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text of the metric.
+            labels (tuple): The label names of the metric.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = Lock()
+
+    def samples(self) -> List[str]:
+        """
+        Returns the exposition lines of the metric samples.
+        """
+        return []
+
+    def render(self) -> str:
+        """
+        Renders the metric with its HELP and TYPE lines.
+        """
+        lines = ['# HELP {} {}'.format(self.name, self.documentation),
+                 '# TYPE {} {}'.format(self.name, self.kind)]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """
+    Counter is a monotonically increasing value per label set.
+    """
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initializes a counter with no samples.
+        """
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, amount: float = 1, *label_values: str) -> None:
+        """
+        Increments the counter of the given label values.
+
+        Args:
+            amount (float): The increment.
+            label_values (str): The label values, in declaration order.
+        """
+        with self._lock:
+            self._values[label_values] = \
+                self._values.get(label_values, 0) + amount
+
+    def samples(self) -> List[str]:
+        """
+        Returns the exposition lines of the counter.
+        """
+        with self._lock:
+            values = list(self._values.items())
+        return ['{}{} {}'.format(self.name,
+                                 _format_labels(self.labels, key), value)
+                for key, value in values]
+
+
+class Histogram(Metric):
+    """
+    Histogram counts observations in cumulative buckets per label set.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str,
+                 labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """
+        Initializes a histogram with no observations.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text of the metric.
+            labels (tuple): The label names of the metric.
+            buckets (tuple): The sorted upper bounds of the buckets.
+        """
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        """
+        Records one observation for the given label values.
+
+        Args:
+            value (float): The observed value.
+            label_values (str): The label values, in declaration order.
+        """
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = [[0] * len(self.buckets), 0, 0.0]
+                self._values[label_values] = entry
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += 1
+            entry[2] += value
+
+    def samples(self) -> List[str]:
+        """
+        Returns the exposition lines of the histogram.
+        """
+        with self._lock:
+            values = [(k, (list(v[0]), v[1], v[2]))
+                      for k, v in self._values.items()]
+        lines = []
+        names = self.labels + ('le',)
+        for key, (counts, count, total) in values:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append('{}_bucket{} {}'.format(
+                    self.name, _format_labels(names, key + (bound,)),
+                    cumulative))
+            lines.append('{}_bucket{} {}'.format(
+                self.name, _format_labels(names, key + ('+Inf',)), count))
+            labels = _format_labels(self.labels, key)
+            lines.append('{}_count{} {}'.format(self.name, labels, count))
+            lines.append('{}_sum{} {}'.format(self.name, labels, total))
+        return lines
+
+
+class CallbackMetric(Metric):
+    """
+    CallbackMetric reads its value from a function when rendered, for
+    values that are already tracked elsewhere.
+    """
+
+    def __init__(self, name: str, documentation: str,
+                 callback: Callable[[], float], kind: str = 'gauge'):
+        """
+        Initializes a callback metric.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text of the metric.
+            callback (callable): Returns the current value.
+            kind (str): The Prometheus type, 'gauge' or 'counter'.
+        """
+        super().__init__(name, documentation)
+        self.callback = callback
+        self.kind = kind
+
+    def samples(self) -> List[str]:
+        """
+        Returns the exposition line of the current value.
+        """
+        return ['{} {}'.format(self.name, self.callback())]
+
+
+class Registry:
+    """
+    Registry keeps the metrics of the process and renders them.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty registry.
+        """
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Registers a metric, or returns the one already registered under
+        the same name.
+
+        Args:
+            metric (Metric): The metric to register.
+
+        Returns:
+            Metric: The registered metric.
+        """
+        return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        """
+        Renders every registered metric in the Prometheus text format.
+        """
+        return '\n'.join(m.render() for m in self._metrics.values()) + '\n'
+
+    def reinit(self) -> None:
+        """
+        Resets the metrics of a freshly forked worker: locks that another
+        thread of the parent may have held are replaced, and the samples
+        recorded by the parent are dropped so each worker reports its own.
+        """
+        for metric in self._metrics.values():
+            metric._lock = Lock()
+            if hasattr(metric, '_values'):
+                metric._values = {}
+
+
+REGISTRY = Registry()
+os.register_at_fork(after_in_child=REGISTRY.reinit)
+
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'Request latency per route.',
+    ('route', 'method', 'status')))
+AUTH_LATENCY = REGISTRY.register(Histogram(
+    'auth_before_request_duration_seconds',
+    'Time spent authenticating requests in before_request.'))
+
+REGISTRY.register(CallbackMetric(
+    'storage_save_to_file_total', 'Calls to Base.save_to_file.',
+    lambda: STATS['save_to_file_calls'], 'counter'))
+REGISTRY.register(CallbackMetric(
+    'storage_save_to_file_seconds_total',
+    'Time spent in Base.save_to_file.',
+    lambda: STATS['save_to_file_seconds'], 'counter'))
+REGISTRY.register(CallbackMetric(
+    'storage_save_to_file_bytes_total',
+    'Bytes written by Base.save_to_file.',
+    lambda: STATS['save_to_file_bytes'], 'counter'))
+REGISTRY.register(CallbackMetric(
+    'storage_search_total', 'Calls to Base.search.',
+    lambda: STATS['search_calls'], 'counter'))
+REGISTRY.register(CallbackMetric(
+    'storage_search_scanned_objects_total',
+    'Objects scanned by Base.search.',
+    lambda: STATS['search_scanned'], 'counter'))
+REGISTRY.register(CallbackMetric(
+    'storage_search_matched_objects_total',
+    'Objects returned by Base.search.',
+    lambda: STATS['search_matched'], 'counter'))
+REGISTRY.register(CallbackMetric(
+    'json_cache_hits_total', 'Base.to_json cache hits.',
+    lambda: STATS['json_cache_hits'], 'counter'))
+REGISTRY.register(CallbackMetric(
+    'json_cache_misses_total', 'Base.to_json cache misses.',
+    lambda: STATS['json_cache_misses'], 'counter'))
+REGISTRY.register(CallbackMetric(
+    'email_filter_rejections_total',
+    'Logins rejected by the registered email filter without a search.',
+    lambda: STATS['email_filter_rejections'], 'counter'))
+REGISTRY.register(CallbackMetric(
+    'email_filter_false_positive_rate',
+    'Estimated false positive rate of the registered email filter.',
+    lambda: User.email_filter.false_positive_rate()))
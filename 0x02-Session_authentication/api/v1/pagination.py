@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+This module provides the cursor pagination of the listing endpoints and
+the streaming of unpaginated listings as a chunked JSON array.
+
+A cursor is the ID of the last object of the previous page; pages are in
+ID order, so they stay consistent while objects are created or removed.
+"""
+from os import getenv
+from typing import Callable, Iterator, List, Optional, Tuple
+from werkzeug.datastructures import MultiDict
+
+
+PAGE_SIZE_MAX = int(getenv('PAGE_SIZE_MAX', '1000'))
+STREAM_CHUNK_SIZE = int(getenv('STREAM_CHUNK_SIZE', '500'))
+
+
+def parse_page_args(args: MultiDict) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Reads the `cursor` and `limit` query parameters.
+
+    Args:
+        args (MultiDict): The query parameters of the request.
+
+    Returns:
+        tuple: The cursor (or None) and the page size (or None when the
+        listing is not paginated).
+
+    Raises:
+        ValueError: If `limit` is not an integer between 1 and
+        PAGE_SIZE_MAX.
+    """
+    cursor = args.get('cursor') or None
+    limit = args.get('limit')
+    if limit is None:
+        return cursor, None
+    try:
+        limit = int(limit)
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= PAGE_SIZE_MAX:
+        raise ValueError(
+            'limit must be an integer between 1 and {}'.format(PAGE_SIZE_MAX))
+    return cursor, limit
+
+
+def page_headers(total: int, next_cursor: Optional[str]) -> dict:
+    """
+    Builds the X-Total-Count and X-Next-Cursor headers of a listing.
+
+    Args:
+        total (int): The number of objects of the listing.
+        next_cursor (str): The cursor of the next page, or None.
+
+    Returns:
+        dict: The headers.
+    """
+    headers = {'X-Total-Count': str(total)}
+    if next_cursor is not None:
+        headers['X-Next-Cursor'] = next_cursor
+    return headers
+
+
+def stream_json_array(cls, dumps: Callable[[dict], str],
+                      cursor: str = None, ids: List[str] = None,
+                      fields: Tuple[str, ...] = None) -> Iterator[str]:
+    """
+    Yields the JSON array of the objects of a class after `cursor`, in ID
+    order, STREAM_CHUNK_SIZE objects at a time, so only one chunk is held
+    in memory whatever the number of objects.
+
+    Args:
+        cls (type): The `Base` subclass to list.
+        dumps (callable): Serialises one JSON dictionary.
+        cursor (str): The ID to start after, or None.
+        ids (list): The sorted IDs to list, or None for all objects.
+        fields (tuple): The fields of each object, or None for all.
+
+    Yields:
+        str: Successive parts of the array.
+    """
+    separator = '['
+    while True:
+        objs, cursor = cls.page(cursor, STREAM_CHUNK_SIZE, ids)
+        if objs:
+            yield separator + ','.join(
+                dumps(obj.to_json(fields=fields)) for obj in objs)
+            separator = ','
+        if cursor is None:
+            break
+    yield '[]' if separator == '[' else ']'
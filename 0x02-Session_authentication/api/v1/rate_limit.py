@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+This module provides a token-bucket rate limiter for the endpoints that
+verify passwords, keyed by client IP and by target email.
+
+Buckets live in a pluggable store: `MemoryBucketStore` keeps them in the
+process, split into independently locked shards with LRU eviction, and
+`SQLiteBucketStore` keeps them in a local SQLite file shared by all the
+worker processes of a host.
+
+The client IP of the current request is kept in the `CLIENT_IP` context
+variable, so the IP bucket is only charged where a password is verified.
+"""
+from collections import OrderedDict
+from contextvars import ContextVar
+from os import getenv
+from threading import Lock
+import math
+import os
+import sqlite3
+import time
+
+
+class RateLimitExceeded(Exception):
+    """
+    Raised when a client exceeds its rate limit.
+
+    Attributes:
+        retry_after (int): Seconds to wait before the next attempt.
+    """
+
+    def __init__(self, retry_after: float):
+        """
+        Initializes the exception.
+
+        Args:
+            retry_after (float): Seconds until a token is available.
+        """
+        super().__init__('Too many requests')
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class BucketStore:
+    """
+    BucketStore is the interface of the token bucket stores.
+    """
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        """
+        Takes one token from the bucket of `key`.
+
+        Args:
+            key (str): The bucket key.
+            rate (float): Tokens added per second.
+            burst (float): Capacity of the bucket.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until
+            one is available.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def refill(tokens: float, elapsed: float, rate: float,
+               burst: float) -> (float, float):
+        """
+        Refills a bucket and takes one token from it.
+
+        Returns:
+            tuple: The remaining tokens and the seconds to wait (0 if a
+            token was taken).
+        """
+        tokens = min(burst, tokens + max(elapsed, 0) * rate)
+        if tokens >= 1:
+            return tokens - 1, 0.0
+        return tokens, (1 - tokens) / rate
+
+
+class MemoryBucketStore(BucketStore):
+    """
+    MemoryBucketStore keeps the buckets of this process in `shards`
+    independently locked LRU maps of at most `max_keys` keys in total.
+    """
+
+    def __init__(self, shards: int = 16, max_keys: int = 100000):
+        """
+        Initializes the store.
+
+        Args:
+            shards (int): The number of shards.
+            max_keys (int): The maximum number of buckets kept; the least
+            recently used ones are evicted first.
+        """
+        self._shards = [(Lock(), OrderedDict()) for _ in range(shards)]
+        self._max_per_shard = max(1, max_keys // shards)
+        os.register_at_fork(after_in_child=self._reinit)
+
+    def _reinit(self) -> None:
+        """
+        Replaces the shard locks in a freshly forked process.
+        """
+        self._shards = [(Lock(), buckets) for _, buckets in self._shards]
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        """
+        Takes one token from the bucket of `key`.
+        """
+        lock, buckets = self._shards[hash(key) % len(self._shards)]
+        now = time.monotonic()
+        with lock:
+            state = buckets.get(key)
+            if state is None:
+                tokens, wait = self.refill(burst, 0, rate, burst)
+            else:
+                tokens, wait = self.refill(state[0], now - state[1],
+                                           rate, burst)
+                buckets.move_to_end(key)
+            buckets[key] = (tokens, now)
+            if len(buckets) > self._max_per_shard:
+                buckets.popitem(last=False)
+        return wait
+
+    def __len__(self) -> int:
+        """
+        Returns the number of buckets kept.
+        """
+        return sum(len(buckets) for _, buckets in self._shards)
+
+
+class SQLiteBucketStore(BucketStore):
+    """
+    SQLiteBucketStore keeps the buckets in a SQLite file, so the worker
+    processes of a host share the same limits.
+    """
+
+    def __init__(self, path: str, max_keys: int = 100000):
+        """
+        Initializes the store.
+
+        Args:
+            path (str): The SQLite database file.
+            max_keys (int): The number of buckets above which the least
+            recently updated ones are deleted.
+        """
+        self.path = path
+        self.max_keys = max_keys
+        self._conn = None
+        self._lock = Lock()
+        self._writes = 0
+        os.register_at_fork(after_in_child=self._reinit)
+
+    def _reinit(self) -> None:
+        """
+        Drops the connection and lock inherited by a freshly forked
+        process; SQLite connections must not cross a fork.
+        """
+        self._conn = None
+        self._lock = Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Returns the connection of the current process, opening it on
+        first use.
+        """
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=5,
+                                         isolation_level=None,
+                                         check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY,'
+                ' tokens REAL NOT NULL, updated REAL NOT NULL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS buckets_updated'
+                               ' ON buckets (updated)')
+        return self._conn
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        """
+        Takes one token from the bucket of `key`.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    'SELECT tokens, updated FROM buckets WHERE key = ?',
+                    (key,)).fetchone()
+                if row is None:
+                    tokens, wait = self.refill(burst, 0, rate, burst)
+                else:
+                    tokens, wait = self.refill(row[0], now - row[1],
+                                               rate, burst)
+                conn.execute('INSERT OR REPLACE INTO buckets'
+                             ' VALUES (?, ?, ?)', (key, tokens, now))
+                self._writes += 1
+                if self._writes % 1000 == 0:
+                    conn.execute(
+                        'DELETE FROM buckets WHERE key IN (SELECT key FROM'
+                        ' buckets ORDER BY updated DESC LIMIT -1 OFFSET ?)',
+                        (self.max_keys,))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return wait
+
+
+class RateLimiter:
+    """
+    RateLimiter applies a token bucket per key.
+    """
+
+    def __init__(self, rate: float, burst: float, store: BucketStore):
+        """
+        Initializes the limiter.
+
+        Args:
+            rate (float): Allowed attempts per second, on average. A rate
+            of 0 or less disables the limiter.
+            burst (float): Allowed attempts in a burst.
+            store (BucketStore): The store of the buckets.
+        """
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.store = store
+
+    def check(self, key: str) -> None:
+        """
+        Counts one attempt for `key`.
+
+        Args:
+            key (str): The key, e.g. 'ip:10.0.0.1'.
+
+        Raises:
+            RateLimitExceeded: If the key has no attempt left.
+        """
+        if self.rate <= 0 or key is None:
+            return
+        wait = self.store.take(key, self.rate, self.burst)
+        if wait > 0:
+            raise RateLimitExceeded(wait)
+
+
+def build_store() -> BucketStore:
+    """
+    Builds the bucket store selected by RATE_LIMIT_STORE ('memory', the
+    default, or 'sqlite' with the file given by RATE_LIMIT_DB).
+    """
+    if getenv('RATE_LIMIT_STORE', 'memory') == 'sqlite':
+        return SQLiteBucketStore(getenv('RATE_LIMIT_DB', '.rate_limit.db'))
+    return MemoryBucketStore(int(getenv('RATE_LIMIT_SHARDS', '16')),
+                             int(getenv('RATE_LIMIT_MAX_KEYS', '100000')))
+
+
+STORE = build_store()
+TRUSTED_PROXIES = int(getenv('RATE_LIMIT_TRUSTED_PROXIES', '0'))
+CLIENT_IP = ContextVar('client_ip', default=None)
+IP_LIMITER = RateLimiter(float(getenv('RATE_LIMIT_IP_RATE', '0')),
+                         float(getenv('RATE_LIMIT_IP_BURST', '50')), STORE)
+EMAIL_LIMITER = RateLimiter(float(getenv('RATE_LIMIT_EMAIL_RATE', '5')),
+                            float(getenv('RATE_LIMIT_EMAIL_BURST', '20')),
+                            STORE)
+
+
+def request_ip(request) -> str:
+    """
+    Returns the client IP of a request: with RATE_LIMIT_TRUSTED_PROXIES
+    proxies in front of the API, the address added to X-Forwarded-For by
+    the outermost of them, otherwise the peer address.
+
+    Args:
+        request (object): The Flask or Quart request.
+    """
+    forwarded_for = request.headers.get('X-Forwarded-For')
+    if TRUSTED_PROXIES > 0 and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(',')]
+        if len(hops) >= TRUSTED_PROXIES:
+            return hops[-TRUSTED_PROXIES]
+    return request.remote_addr
+
+
+def check_ip(ip: str) -> None:
+    """
+    Counts one password verification attempt from a client IP.
+
+    Raises:
+        RateLimitExceeded: If the client has no attempt left.
+    """
+    IP_LIMITER.check('ip:{}'.format(ip) if ip else None)
+
+
+def check_email(email: str) -> None:
+    """
+    Counts one password verification attempt against an email.
+
+    Raises:
+        RateLimitExceeded: If the email has no attempt left.
+    """
+    EMAIL_LIMITER.check('email:{}'.format(email) if email else None)
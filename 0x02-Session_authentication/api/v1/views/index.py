@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """ Module of Index views
 """
-from flask import jsonify, abort
+from flask import jsonify, abort, Response
 from api.v1.views import app_views
 
 
@@ -26,6 +26,17 @@ def stats() -> str:
     return jsonify(stats)
 
 
+@app_views.route('/metrics', methods=['GET'], strict_slashes=False)
+def metrics() -> Response:
+    """ GET /api/v1/metrics
+    Return:
+      - the request, authentication, storage, session and cache
+        metrics in the Prometheus text format
+    """
+    from api.v1.metrics import REGISTRY, CONTENT_TYPE
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
 @app_views.route('/unauthorized', strict_slashes=False)
 def unauthorized() -> None:
     """
@@ -3,8 +3,9 @@
 """
 This module handles the login process using session authentication.
 """
+from api.v1.rate_limit import check_email, check_ip, request_ip
 from api.v1.views import app_views
-from flask import abort, jsonify, request, session
+from flask import abort, current_app, jsonify, request, session
 from os import getenv
 from models.user import User
 
@@ -16,6 +17,10 @@ def session_login():
 
     Returns:
         Response: JSON response with user data or error message.
+
+    Raises:
+        RateLimitExceeded: If the client IP or the email has no login
+        attempt left (answered with 429).
     """
     user_email = request.form.get('email')
     user_password = request.form.get('password')
@@ -26,13 +31,17 @@ def session_login():
     if not user_password:
         return jsonify({"error": "password missing"}), 400
 
+    check_ip(request_ip(request))
+    check_email(user_email)
+    if not User.email_may_exist(user_email):
+        return jsonify({"error": "no user found for this email"}), 404
     users = User.search({"email": user_email})
     if not users or users == []:
         return jsonify({"error": "no user found for this email"}), 404
 
     for user in users:
         if user.is_valid_password(user_password):
-            from api.v1.app import auth
+            auth = current_app.extensions['auth']
             session_id = auth.create_session(user.id)
             user_data = user.to_json()
             response = jsonify(user_data)
@@ -40,3 +49,20 @@ def session_login():
             return response
 
     return jsonify({"error": "wrong password"}), 401
+
+
+@app_views.route('/auth_session/logout', methods=['DELETE'],
+                 strict_slashes=False)
+def session_logout():
+    """
+    Handle the logout process using session authentication.
+
+    Returns:
+        Response: An empty JSON dictionary, or a 404 error if the request
+        has no valid session.
+    """
+    auth = current_app.extensions['auth']
+    destroy_session = getattr(auth, 'destroy_session', None)
+    if destroy_session is None or not destroy_session(request):
+        abort(404)
+    return jsonify({}), 200
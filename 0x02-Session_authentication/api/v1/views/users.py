@@ -1,50 +1,184 @@
 #!/usr/bin/env python3
 """ Module of Users views
 """
+from api.v1.http_cache import not_modified, with_etag
+from api.v1.pagination import page_headers, parse_page_args, stream_json_array
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, current_app, jsonify, request
 from models.user import User
+from os import getenv
+from typing import List, Optional, Tuple
+from werkzeug.datastructures import MultiDict
+import json
+
+
+BULK_MAX_USERS = int(getenv('BULK_MAX_USERS', '10000'))
+
+
+def parse_bulk_records(data: bytes) -> list:
+    """ Read the records of a bulk request body: a JSON array, or one
+    JSON object per line (NDJSON)
+
+    An NDJSON line that is not valid JSON gives a None record, so it is
+    reported with the other invalid records.
+
+    Raises:
+      - ValueError if the body is empty or not a valid JSON array
+    """
+    body = data.strip()
+    if not body:
+        raise ValueError("Wrong format")
+    if body.startswith(b'['):
+        records = json.loads(body)
+        if not isinstance(records, list):
+            raise ValueError("Wrong format")
+        return records
+    records = []
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            records.append(None)
+    return records
+
+
+def build_bulk_users(records: list) -> Tuple[List[User], list]:
+    """ Validate bulk records and build (without saving) their users
+
+    Passwords are hashed one after the other: SHA-256 of a short
+    password only takes a microsecond or two, and hashlib holds the GIL
+    for such small inputs, so a thread pool would only add overhead.
+
+    Return:
+      - the users to save
+      - the result of each record, in order: its User, or a dictionary
+        with the validation error
+    """
+    users = []
+    results = []
+    for record in records:
+        error_msg = None
+        if not isinstance(record, dict):
+            error_msg = "Wrong format"
+        elif not isinstance(record.get("email"), str) or \
+                record.get("email") == "":
+            error_msg = "email missing"
+        elif not isinstance(record.get("password"), str) or \
+                record.get("password") == "":
+            error_msg = "password missing"
+        if error_msg is not None:
+            results.append({'error': error_msg})
+            continue
+        user = User()
+        user.email = record.get("email")
+        user.password = record.get("password")
+        user.first_name = record.get("first_name")
+        user.last_name = record.get("last_name")
+        users.append(user)
+        results.append(user)
+    return users, results
+
+
+def filter_user_ids(args: MultiDict) -> Optional[List[str]]:
+    """ Find the users matching the `email` (exact), `email_prefix` and
+    `name_prefix` (first or last name) query parameters, through the
+    indexes of User; prefixes are case-insensitive
+
+    Return:
+      - the sorted IDs of the users matching every given parameter, or
+        None if none is given
+    """
+    matches = []
+    if 'email' in args:
+        matches.append(User.find_ids('email', args.get('email')))
+    if 'email_prefix' in args:
+        matches.append(User.find_prefix_ids('email',
+                                            args.get('email_prefix')))
+    if 'name_prefix' in args:
+        matches.append(User.find_prefix_ids('name', args.get('name_prefix')))
+    if not matches:
+        return None
+    if len(matches) == 1:
+        return matches[0]
+    return sorted(set(matches[0]).intersection(*matches[1:]))
 
 
-@app_views.route('/users/me', methods=['GET'], strict_slashes=False)
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters:
+      - limit (optional): page size, up to PAGE_SIZE_MAX
+      - cursor (optional): X-Next-Cursor of the previous page
+      - email (optional): exact email
+      - email_prefix (optional): case-insensitive email prefix
+      - name_prefix (optional): case-insensitive first or last name prefix
+      - fields (optional): comma-separated fields of each User
     Return:
-      - list of all User objects JSON represented
+      - list of the (matching) User objects JSON represented, in ID
+        order: one page if `limit` is given, otherwise all of them (after
+        `cursor`), streamed as a chunked JSON array
+      - X-Total-Count and X-Next-Cursor (when more pages follow) headers
+      - 304 if the If-None-Match header matches the current ETag
+      - 400 if `limit` or `fields` is invalid
     """
-    all_users = [user.to_json() for user in User.all()]
-    if request.path == '/api/v1/users/me'\
-       or request.path == '/api/v1/users/me/':
-        user_t = {}
-        for user in all_users:
-            user_t.update(user)
-        return jsonify(user_t)
-    return jsonify(all_users)
+    try:
+        cursor, limit = parse_page_args(request.args)
+        fields = User.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    etag = User.generation()
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    ids = filter_user_ids(request.args)
+    total = User.count() if ids is None else len(ids)
+    if limit is None:
+        response = Response(
+            stream_json_array(User, current_app.json.dumps, cursor, ids,
+                              fields),
+            mimetype='application/json')
+        next_cursor = None
+    else:
+        users, next_cursor = User.page(cursor, limit, ids)
+        response = jsonify([user.to_json(fields=fields) for user in users])
+    response.headers.update(page_headers(total, next_cursor))
+    return with_etag(response, etag)
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
 def view_one_user(user_id: str = None) -> str:
     """ GET /api/v1/users/:id
     Path parameter:
-      - User ID
+      - User ID, or `me` for the authenticated user
+    Query parameter:
+      - fields (optional): comma-separated fields to return
     Return:
       - User object JSON represented
+      - 304 if the If-None-Match header matches the current ETag
+      - 400 if `fields` is invalid
       - 404 if the User ID doesn't exist
     """
     if user_id is None:
         abort(404)
-    if user_id is 'me' and request.current_user is None:
-        abort(404)
-    if user_id is 'me' and request.current_user is not None:
-        user = request.current_user
+    try:
+        fields = User.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if user_id == 'me':
+        context = getattr(request, 'auth_context', None)
+        user = context.user if context is not None else None
     else:
         user = User.get(user_id)
-
     if user is None:
         abort(404)
 
-    return jsonify(user.to_json())
+    etag = user.version()
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    return with_etag(jsonify(user.to_json(fields=fields)), etag)
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
@@ -53,7 +187,8 @@ def delete_user(user_id: str = None) -> str:
     Path parameter:
       - User ID
     Return:
-      - empty JSON is the User has been correctly deleted
+      - empty JSON is the User has been correctly deleted, after all of
+        its sessions have been revoked
       - 404 if the User ID doesn't exist
     """
     if user_id is None:
@@ -62,6 +197,10 @@ def delete_user(user_id: str = None) -> str:
     if user is None:
         abort(404)
     user.remove()
+    destroy_all_sessions = getattr(current_app.extensions['auth'],
+                                   'destroy_all_sessions', None)
+    if destroy_all_sessions is not None:
+        destroy_all_sessions(user.id)
     return jsonify({}), 200
 
 
@@ -103,6 +242,38 @@ def create_user() -> str:
     return jsonify({'error': error_msg}), 400
 
 
+@app_views.route('/users/bulk', methods=['POST'], strict_slashes=False)
+def create_users() -> str:
+    """ POST /api/v1/users/bulk
+    Body: a JSON array, or NDJSON (one JSON object per line), of users:
+      - email
+      - password
+      - last_name (optional)
+      - first_name (optional)
+    Every record is validated before anything is saved, then the valid
+    ones are saved with a single write of the store.
+    Return:
+      - list of the results, in the order of the records: the User
+        object JSON represented, or {"error": ...} for an invalid record
+      - 400 if the body can't be read, has more than BULK_MAX_USERS
+        records, or the Users can't be saved
+    """
+    try:
+        records = parse_bulk_records(request.get_data())
+    except ValueError:
+        return jsonify({'error': "Wrong format"}), 400
+    if len(records) > BULK_MAX_USERS:
+        return jsonify({'error': "Too many users (max {})".format(
+            BULK_MAX_USERS)}), 400
+    users, results = build_bulk_users(records)
+    try:
+        User.save_many(users)
+    except Exception as e:
+        return jsonify({'error': "Can't create Users: {}".format(e)}), 400
+    return jsonify([result if isinstance(result, dict) else result.to_json()
+                    for result in results]), 200
+
+
 @app_views.route('/users/<user_id>', methods=['PUT'], strict_slashes=False)
 def update_user(user_id: str = None) -> str:
     """ PUT /api/v1/users/:id
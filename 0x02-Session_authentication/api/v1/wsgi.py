@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+WSGI entry point of the API for multi-process servers.
+
+Run with a preloading master so the data is loaded before the worker is
+forked, and one worker serving requests from threads, e.g.:
+    gunicorn --preload --workers 1 --threads 8 api.v1.wsgi:app
+
+Several workers do not lose each other's writes (see `Base.save_to_file`),
+but each one only sees its own until it is restarted.
+"""
+from api.v1.app import create_app
+
+
+app = create_app()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks of the per-request authentication pipeline and of the
+storage, on reproducible synthetic datasets. No server is needed.
+
+Usage (from the project root):
+    python3 -m benchmarks.bench_auth [--sizes 1000 100000 1000000]
+        [--output results.json] [--compare previous.json]
+
+Results are written as JSON; --compare prints the ratio of each timing
+to a previous run and flags regressions above --threshold (default 10%).
+The rate limiter is disabled, it would otherwise be what is measured.
+"""
+from api.v1.auth.auth import Auth
+from api.v1.auth.basic_auth import BasicAuth
+from api.v1.auth.session_auth import SessionAuth
+from api.v1.rate_limit import EMAIL_LIMITER, IP_LIMITER
+from models.base import (DATA, HASH_INDEXES, PREFIX_INDEXES, SHARDS,
+                         SORTED_IDS)
+from models.user import User
+import argparse
+import base64
+import glob
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+import uuid
+
+PASSWORD = 'bench-password'
+
+
+class FakeRequest:
+    """
+    Minimal stand-in for a Flask request: headers and cookies only.
+    """
+
+    def __init__(self, headers: dict = None, cookies: dict = None):
+        """
+        Initializes the request.
+        """
+        self.headers = headers or {}
+        self.cookies = cookies or {}
+
+
+def reset_storage() -> None:
+    """
+    Removes the user files of the working directory and the in-memory
+    users, shards, sorted IDs and indexes.
+    """
+    for file_path in glob.glob('.db_User*'):
+        os.remove(file_path)
+    DATA['User'] = {}
+    SHARDS['User'] = None
+    SORTED_IDS['User'] = None
+    HASH_INDEXES['User'] = None
+    PREFIX_INDEXES['User'] = None
+
+
+def make_users(count: int, seed: int = 0) -> list:
+    """
+    Replaces the stored users by `count` synthetic users, all with the
+    same password. IDs and emails only depend on `seed`.
+
+    Returns:
+        list: The users, in creation order.
+    """
+    rng = random.Random(seed)
+    hashed = User(email='x')
+    hashed.password = PASSWORD
+    reset_storage()
+    users = []
+    for i in range(count):
+        user = User(id=str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                    email='user{}@example.com'.format(i),
+                    _password=hashed.password,
+                    first_name='First{}'.format(i),
+                    last_name='Last{}'.format(i))
+        DATA['User'][user.id] = user
+        users.append(user)
+    User.reshard(len(User._shards()))
+    User.rebuild_email_filter()
+    return users
+
+
+def measure(func, min_time: float = 0.2, repeat: int = 3) -> dict:
+    """
+    Times `func` like timeit: the loop count is calibrated to last at
+    least `min_time`, and the best of `repeat` runs is kept.
+
+    Returns:
+        dict: The time per call in nanoseconds and the loop count.
+    """
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    if elapsed < min_time:
+        number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return {'ns_per_op': round(best / number * 1e9, 1), 'loops': number}
+
+
+def bench_size(count: int, seed: int) -> dict:
+    """
+    Runs every benchmark on a dataset of `count` users.
+
+    Returns:
+        dict: The results, keyed by benchmark name.
+    """
+    users = make_users(count, seed)
+    target = users[len(users) // 2]
+    basic = BasicAuth()
+    header = 'Basic ' + base64.b64encode(
+        '{}:{}'.format(target.email, PASSWORD).encode()).decode()
+    b64 = basic.extract_base64_authorization_header(header)
+    decoded = basic.decode_base64_authorization_header(b64)
+    basic_request = FakeRequest(headers={'Authorization': header})
+
+    session = SessionAuth()
+    session_id = session.create_session(target.id)
+    session_request = FakeRequest(
+        cookies={session.session_name: session_id})
+
+    auth = Auth()
+    excluded = ['/api/v1/status/', '/api/v1/unauthorized/',
+                '/api/v1/forbidden/', '/api/v1/auth_session/login/',
+                '/api/v1/stat*']
+
+    results = {
+        'basic.extract': measure(
+            lambda: basic.extract_base64_authorization_header(header)),
+        'basic.decode': measure(
+            lambda: basic.decode_base64_authorization_header(b64)),
+        'basic.split': measure(
+            lambda: basic.extract_user_credentials(decoded)),
+        'basic.parse': measure(
+            lambda: basic.parse_authorization_header(header)),
+        'basic.lookup': measure(
+            lambda: User.search({'email': target.email})),
+        'basic.verify': measure(
+            lambda: target.is_valid_password(PASSWORD)),
+        'basic.current_user': measure(
+            lambda: basic.current_user(basic_request)),
+        'session.current_user': measure(
+            lambda: session.current_user(session_request)),
+        'auth.require_auth': measure(
+            lambda: auth.require_auth('/api/v1/users/', excluded)),
+        'base.search': measure(
+            lambda: User.search({'first_name': target.first_name})),
+        'base.save': measure(target.save, min_time=0.5, repeat=3),
+        'base.load_from_file': measure(User.load_from_file, min_time=0.5,
+                                       repeat=3),
+    }
+    session.store.delete(session_id)
+    return results
+
+
+def compare(current: dict, previous: dict, threshold: float) -> int:
+    """
+    Prints the ratio of each timing to a previous run.
+
+    Returns:
+        int: The number of regressions above `threshold`.
+    """
+    regressions = 0
+    for size, results in current['results'].items():
+        old_results = previous.get('results', {}).get(size, {})
+        for name, result in results.items():
+            old = old_results.get(name)
+            if old is None:
+                continue
+            ratio = result['ns_per_op'] / old['ns_per_op']
+            flag = ''
+            if ratio > 1 + threshold:
+                flag = '  REGRESSION'
+                regressions += 1
+            print('{:>8} {:<24} {:>14.1f} ns  x{:.2f}{}'.format(
+                size, name, result['ns_per_op'], ratio, flag))
+    return regressions
+
+
+def main() -> int:
+    """
+    Parses the arguments, runs the benchmarks and writes the results.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 100000])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON results here')
+    parser.add_argument('--compare', help='previous JSON results')
+    parser.add_argument('--threshold', type=float, default=0.10)
+    args = parser.parse_args()
+    IP_LIMITER.rate = EMAIL_LIMITER.rate = 0
+
+    workdir = tempfile.mkdtemp(prefix='bench_auth_')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        results = {}
+        for size in args.sizes:
+            results[str(size)] = bench_size(size, args.seed)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            return 1 if compare(report, json.load(f), args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the fused Basic Authorization parser against the
+chained extract/decode/split methods, on valid and invalid headers.
+
+Usage (from the project root):
+    python3 -m benchmarks.bench_basic_parser
+"""
+from api.v1.auth.basic_auth import BasicAuth
+import base64
+import json
+import timeit
+
+VALID = 'Basic ' + base64.b64encode(b'bob@hbtn.io:H0lbertonSchool98!').decode()
+HEADERS = {
+    'valid': VALID,
+    'no_separator': 'Basic ' + base64.b64encode(b'bob@hbtn.io').decode(),
+    'bad_alphabet': 'Basic Ym9iQGhidG4uaW8!!!',
+    'bad_padding': VALID[:-1],
+    'wrong_scheme': 'Bearer ' + VALID[6:],
+    'oversized': 'Basic ' + 'A' * 65536,
+}
+
+
+def chained(auth: BasicAuth, header: str) -> (str, str):
+    """
+    Parses a header with the chained methods.
+    """
+    b64 = auth.extract_base64_authorization_header(header)
+    decoded = auth.decode_base64_authorization_header(b64)
+    return auth.extract_user_credentials(decoded)
+
+
+def bench(name: str, header: str, number: int = 20000) -> dict:
+    """
+    Times both parsers on one header.
+
+    Args:
+        name (str): The name of the case.
+        header (str): The Authorization header value.
+        number (int): The number of calls per measurement.
+
+    Returns:
+        dict: The case name and the time per call of each parser, in
+        nanoseconds.
+    """
+    auth = BasicAuth()
+    result = {'case': name}
+    for label, func in (('chained', lambda: chained(auth, header)),
+                        ('fused', lambda: auth.parse_authorization_header(
+                            header))):
+        seconds = min(timeit.repeat(func, number=number, repeat=5))
+        result[label + '_ns'] = round(seconds / number * 1e9, 1)
+    return result
+
+
+if __name__ == "__main__":
+    print(json.dumps([bench(name, header)
+                      for name, header in HEADERS.items()], indent=2))
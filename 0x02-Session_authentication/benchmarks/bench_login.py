@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Concurrent login load test, to compare the WSGI (`api.v1.wsgi`) and ASGI
+(`api.v1.asgi`) applications at the same worker count.
+
+Usage (from the project root):
+    python3 -m benchmarks.bench_login seed --users 50
+    SESSION_NAME=_my_session_id AUTH_TYPE=session_auth \\
+        gunicorn --preload --workers 2 -b 127.0.0.1:5000 api.v1.wsgi:app
+    python3 -m benchmarks.bench_login run --concurrency 32
+
+    SESSION_NAME=_my_session_id AUTH_TYPE=session_auth \\
+        hypercorn --workers 2 -b 127.0.0.1:5000 'api.v1.asgi:create_app()'
+    python3 -m benchmarks.bench_login run --concurrency 32
+
+`seed` writes the users straight to the storage files, so it must run
+before the server starts. Start the server with RATE_LIMIT_IP_RATE=0 and
+RATE_LIMIT_EMAIL_RATE=0 to measure raw throughput rather than the rate
+limiter. Results are printed as JSON.
+"""
+import argparse
+import json
+import requests
+import threading
+import time
+
+PASSWORD = 'bench-password'
+
+
+def email_of(index: int) -> str:
+    """
+    Returns the email of the `index`-th seeded user.
+    """
+    return 'bench-{}@example.com'.format(index)
+
+
+def percentile(values: list, ratio: float) -> float:
+    """
+    Returns the value at the given ratio of the sorted values.
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(ratio * len(values)))]
+
+
+def seed(count: int) -> None:
+    """
+    Adds `count` users with known credentials to the storage files.
+    """
+    from models.user import User
+
+    User.load_from_file()
+    existing = {user.email for user in User.all()}
+    for index in range(count):
+        if email_of(index) in existing:
+            continue
+        user = User(email=email_of(index))
+        user.password = PASSWORD
+        user.save()
+
+
+def run(url: str, users: int, concurrency: int, duration: float) -> dict:
+    """
+    Logs in concurrently for `duration` seconds, each thread reusing one
+    keep-alive connection.
+
+    Returns:
+        dict: The throughput, error count and latency percentiles.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index: int):
+        local, failed = [], 0
+        with requests.Session() as session:
+            i = index
+            while time.perf_counter() < deadline:
+                data = {'email': email_of(i % users), 'password': PASSWORD}
+                i += concurrency
+                start = time.perf_counter()
+                response = session.post(url + '/api/v1/auth_session/login',
+                                        data=data)
+                local.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(i,))
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'throughput_rps': round(len(latencies) / duration, 1),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 2),
+            'p90': round(percentile(latencies, 0.90) * 1000, 2),
+            'p99': round(percentile(latencies, 0.99) * 1000, 2),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('command', choices=['seed', 'run'])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.command == 'seed':
+        seed(args.users)
+    else:
+        result = run(args.url, args.users, args.concurrency, args.duration)
+        result.update(url=args.url, concurrency=args.concurrency)
+        print(json.dumps(result, indent=2))
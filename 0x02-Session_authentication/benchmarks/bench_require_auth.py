@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of `Auth.require_auth` as the number of excluded path
+rules grows.
+
+Usage (from the project root):
+    python3 -m benchmarks.bench_require_auth [rule counts ...]
+"""
+from api.v1.auth.auth import Auth
+from api.v1.auth.path_matcher import PathMatcher
+import json
+import random
+import sys
+import timeit
+
+
+def make_rules(count: int, seed: int = 0) -> list:
+    """
+    Builds `count` synthetic rules, one in four being a wildcard.
+
+    Args:
+        count (int): The number of rules.
+        seed (int): The random seed, for reproducible rule sets.
+
+    Returns:
+        list: The rules.
+    """
+    rng = random.Random(seed)
+    rules = []
+    for i in range(count):
+        rule = '/api/v1/public/{}/{:x}'.format(i, rng.getrandbits(32))
+        rules.append(rule + ('*' if i % 4 == 0 else '/'))
+    return rules
+
+
+def bench(count: int, number: int = 20000) -> dict:
+    """
+    Times `require_auth` for a protected path (worst case, no rule
+    matches) with `count` rules.
+
+    Args:
+        count (int): The number of rules.
+        number (int): The number of calls per measurement.
+
+    Returns:
+        dict: The rule count and the time per call in nanoseconds.
+    """
+    auth = Auth()
+    matcher = PathMatcher(make_rules(count))
+    path = '/api/v1/users/3f1c2a/'
+    seconds = min(timeit.repeat(
+        lambda: auth.require_auth(path, matcher), number=number, repeat=5))
+    return {'rules': count, 'ns_per_call': round(seconds / number * 1e9, 1)}
+
+
+if __name__ == "__main__":
+    counts = [int(c) for c in sys.argv[1:]] or [10, 100, 1000, 10000]
+    print(json.dumps([bench(count) for count in counts], indent=2))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of session lookups and of the memory held per session in
+each session store backend, including signed tokens.
+
+Usage (from the project root):
+    python3 -m benchmarks.bench_session_store [session counts ...]
+"""
+from api.v1.auth.session_store import (MemorySessionStore,
+                                       SignedSessionStore,
+                                       SQLiteSessionStore)
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+import uuid
+
+
+def fill(store, count: int, seed: int = 0) -> (str, int):
+    """
+    Stores `count` sessions expiring in one hour, of random users.
+
+    Returns:
+        tuple: The session ID of the middle session, and the bytes of
+        Python memory still held once the other session IDs are dropped.
+    """
+    rng = random.Random(seed)
+    expires_at = time.time() + 3600
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    session_ids = []
+    for _ in range(count):
+        user_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        session_id = store.new_session_id(user_id, expires_at)
+        store.set(session_id, user_id, expires_at)
+        session_ids.append(session_id)
+    hit = session_ids[count // 2]
+    del session_ids
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return hit, held
+
+
+def bench(count: int, number: int = 20000) -> list:
+    """
+    Times `get` of a known session (hit) and of an unknown one (miss)
+    in each backend holding `count` sessions, and reports the memory
+    held per session.
+
+    Args:
+        count (int): The number of stored sessions.
+        number (int): The number of calls per measurement.
+
+    Returns:
+        list: One result per backend, with the times per call in
+        nanoseconds.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        backends = {
+            'memory': MemorySessionStore(),
+            'sqlite_cached': SQLiteSessionStore(
+                os.path.join(workdir, 'cached.db'), cache_size=1024),
+            'sqlite_uncached': SQLiteSessionStore(
+                os.path.join(workdir, 'uncached.db'), cache_size=0),
+            'signed': SignedSessionStore(
+                {'k1': os.urandom(32)}, 3600,
+                os.path.join(workdir, 'revocations.db')),
+        }
+        for name, store in backends.items():
+            hit, held = fill(store, count)
+            result = {'backend': name, 'sessions': count,
+                      'bytes_per_session': round(held / count, 1)}
+            for label, session_id in (('hit', hit), ('miss', 'unknown')):
+                seconds = min(timeit.repeat(lambda: store.get(session_id),
+                                            number=number, repeat=5))
+                result[label + '_ns'] = round(seconds / number * 1e9, 1)
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    counts = [int(c) for c in sys.argv[1:]] or [1000, 100000]
+    print(json.dumps([r for count in counts for r in bench(count)],
+                     indent=2))
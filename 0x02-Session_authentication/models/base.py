@@ -1,20 +1,73 @@
 #!/usr/bin/env python3
 """ Base module
 """
+from contextlib import contextmanager
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from typing import Callable, TypeVar, List, Iterable, Optional, Tuple
+from os import getenv, path
+from threading import RLock
+import bisect
+import glob
 import json
+import os
+import tempfile
+import time
 import uuid
+import zlib
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+DB_SHARDS = int(getenv('DB_SHARDS', '1'))
+SHARDS = {}
+GENERATIONS = {}
+SORTED_IDS = {}
+HASH_INDEXES = {}
+PREFIX_INDEXES = {}
+FIELD_SETS = {}
+LOCKS = {}
+FILE_SIGNATURES = {}
+LISTENERS = {}
+EPOCH = [uuid.uuid4().hex[:8]]
+STATS = {
+    'json_cache_hits': 0,
+    'json_cache_misses': 0,
+    'save_to_file_calls': 0,
+    'save_to_file_seconds': 0.0,
+    'save_to_file_bytes': 0,
+    'search_calls': 0,
+    'search_scanned': 0,
+    'search_matched': 0,
+}
+
+
+def _new_epoch():
+    """ Give a forked process its own generation epoch
+    """
+    EPOCH[0] = uuid.uuid4().hex[:8]
+
+
+def _reset_locks():
+    """ Drop the class locks inherited by a forked process
+    """
+    LOCKS.clear()
+
+
+os.register_at_fork(after_in_child=_new_epoch)
+os.register_at_fork(after_in_child=_reset_locks)
 
 
 class Base():
     """ Base class
     """
+    _transient = ('_json_cache', '_indexed')
+    _fields = ('id', 'created_at', 'updated_at')
+    _hash_indexes = ()
+    _prefix_indexes = {}
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
@@ -44,11 +97,96 @@ class Base():
             return False
         return (self.id == other.id)
 
-    def to_json(self, for_serialization: bool = False) -> dict:
+    def __setattr__(self, name: str, value: object):
+        """ Set an attribute and drop the cached JSON representations
+        """
+        object.__setattr__(self, name, value)
+        if name not in self._transient:
+            self.__dict__.pop('_json_cache', None)
+
+    def to_json(self, for_serialization: bool = False,
+                fields: Iterable[str] = None) -> dict:
         """ Convert the object a JSON dictionary
+
+        The result is cached per object (one version for the API and one
+        for storage) until any attribute is set again.
+
+        `fields` restricts the result to these public attributes: they
+        are taken from the cached dictionary when there is one, otherwise
+        only they are converted.
+        """
+        if fields is None:
+            return dict(self._cached_json(for_serialization))
+        cache = self.__dict__.get('_json_cache')
+        full = cache.get(for_serialization) if cache is not None else None
+        if full is not None:
+            return {key: full[key] for key in fields if key in full}
+        result = {}
+        for key in fields:
+            if key not in self.__dict__:
+                continue
+            value = self.__dict__[key]
+            if type(value) is datetime:
+                result[key] = value.strftime(TIMESTAMP_FORMAT)
+            else:
+                result[key] = value
+        return result
+
+    @classmethod
+    def field_set(cls) -> frozenset:
+        """ Return the public fields of the class, compiled once
+        """
+        fields = FIELD_SETS.get(cls.__name__)
+        if fields is None:
+            fields = frozenset(cls._fields)
+            FIELD_SETS[cls.__name__] = fields
+        return fields
+
+    @classmethod
+    def parse_fields(cls, value: str) -> Optional[Tuple[str, ...]]:
+        """ Parse a comma-separated list of public fields, keeping their
+        order and dropping duplicates
+
+        Returns None for an empty list (all fields), and raises
+        ValueError on a field that is not public.
+        """
+        if not value:
+            return None
+        allowed = cls.field_set()
+        fields = []
+        for field in value.split(','):
+            field = field.strip()
+            if field not in allowed:
+                raise ValueError("Unknown field: {}".format(field))
+            if field not in fields:
+                fields.append(field)
+        return tuple(fields)
+
+    def _cached_json(self, for_serialization: bool) -> dict:
+        """ Return the cached JSON dictionary, building it if needed
+
+        The returned dictionary is shared and must not be modified.
+        """
+        cache = self.__dict__.get('_json_cache')
+        if cache is None:
+            cache = {}
+            object.__setattr__(self, '_json_cache', cache)
+        result = cache.get(for_serialization)
+        if result is None:
+            STATS['json_cache_misses'] += 1
+            result = self._build_json(for_serialization)
+            cache[for_serialization] = result
+        else:
+            STATS['json_cache_hits'] += 1
+        return result
+
+    def _build_json(self, for_serialization: bool) -> dict:
+        """ Build the JSON dictionary of the object
         """
         result = {}
         for key, value in self.__dict__.items():
+            if key in self._transient:
+                continue
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -57,49 +195,335 @@ class Base():
                 result[key] = value
         return result
 
+    @classmethod
+    def _file_path(cls, shard: int = None) -> str:
+        """ Path of the storage file of one shard
+
+        A single shard keeps the historical `.db_<Class>.json` name.
+        """
+        s_class = cls.__name__
+        if shard is None:
+            return ".db_{}.json".format(s_class)
+        return ".db_{}-{:04d}.json".format(s_class, shard)
+
+    @classmethod
+    def _manifest_path(cls) -> str:
+        """ Path of the file recording the number of shards on disk
+        """
+        return ".db_{}.meta.json".format(cls.__name__)
+
+    @classmethod
+    def _shards(cls) -> List[set]:
+        """ Return the object IDs of each shard, creating an empty
+        layout of DB_SHARDS shards if nothing has been loaded yet
+        """
+        s_class = cls.__name__
+        if SHARDS.get(s_class) is None:
+            SHARDS[s_class] = [set() for _ in range(max(DB_SHARDS, 1))]
+        return SHARDS[s_class]
+
+    @classmethod
+    def _shard_of(cls, obj_id: str) -> int:
+        """ Index of the shard holding the object `obj_id`
+        """
+        shards = cls._shards()
+        if len(shards) == 1:
+            return 0
+        return zlib.crc32(obj_id.encode()) % len(shards)
+
     @classmethod
     def load_from_file(cls):
         """ Load all objects from file
+
+        Shard files are read one after the other: parsing holds the GIL,
+        so threads would not speed it up.
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
+        with cls._lock():
+            DATA[s_class] = {}
+            SHARDS[s_class] = None
+            SORTED_IDS[s_class] = None
+            HASH_INDEXES[s_class] = None
+            PREFIX_INDEXES[s_class] = None
+            n_shards = DB_SHARDS
+            if path.exists(cls._manifest_path()):
+                with open(cls._manifest_path(), 'r') as f:
+                    n_shards = json.load(f).get('shards', DB_SHARDS)
+            elif path.exists(cls._file_path()):
+                n_shards = 1
+            SHARDS[s_class] = [set() for _ in range(max(n_shards, 1))]
+            for shard in range(n_shards):
+                file_path = cls._file_path(shard if n_shards > 1 else None)
+                if not path.exists(file_path):
+                    FILE_SIGNATURES[file_path] = None
+                    continue
+                with open(file_path, 'r') as f:
+                    FILE_SIGNATURES[file_path] = \
+                        cls._file_signature(os.fstat(f.fileno()))
+                    objs_json = json.load(f)
+                for obj_id, obj_json in objs_json.items():
+                    DATA[s_class][obj_id] = cls(**obj_json)
+                SHARDS[s_class][shard].update(objs_json.keys())
+        cls._bump_generation()
+        cls._notify('load')
+
+    @classmethod
+    def add_listener(cls, listener: Callable[[str, TypeVar('Base')], None]):
+        """ Register `listener(event, obj)`, called after each save
+        ('save') and remove ('remove') of an object of the class, and
+        after each load_from_file ('load', with obj None)
+        """
+        LISTENERS.setdefault(cls.__name__, []).append(listener)
+
+    @classmethod
+    def _notify(cls, event: str, obj: TypeVar('Base') = None):
+        """ Call the listeners of the class
+        """
+        for listener in LISTENERS.get(cls.__name__, ()):
+            listener(event, obj)
+
+    @classmethod
+    def _lock(cls) -> RLock:
+        """ Lock serialising the changes of the class objects and the
+        writes of their files
+        """
+        lock = LOCKS.get(cls.__name__)
+        if lock is None:
+            lock = LOCKS.setdefault(cls.__name__, RLock())
+        return lock
+
+    @classmethod
+    def _bump_generation(cls):
+        """ Record that the objects of the class changed
+        """
+        s_class = cls.__name__
+        GENERATIONS[s_class] = GENERATIONS.get(s_class, 0) + 1
+
+    @classmethod
+    def generation(cls) -> str:
+        """ Return an identifier of the current state of the class objects
+
+        It changes on every load, save and remove, and is unique to the
+        process, so it can be used as a strong ETag of a listing.
+        """
+        return "{}-{}".format(EPOCH[0], GENERATIONS.get(cls.__name__, 0))
+
+    @staticmethod
+    def _file_signature(stat: os.stat_result) -> tuple:
+        """ Identify one version of a storage file: files are replaced,
+        never modified in place
+        """
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    @classmethod
+    @contextmanager
+    def _file_lock(cls):
+        """ Exclusive lock of the class files between processes sharing
+        them, such as forked workers (advisory, where `fcntl` exists)
+        """
+        if fcntl is None:
+            yield
             return
+        with open(".db_{}.lock".format(cls.__name__), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    @classmethod
+    def save_to_file(cls, shards: Iterable[int] = None,
+                     changed: Iterable[str] = None):
+        """ Save objects to file
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        Only the given shards are rewritten, all of them by default, or
+        those of the `changed` object IDs. With `changed`, a shard file
+        that another process replaced since this one last read or wrote
+        it is re-read under the class file lock, and only the changed
+        objects are replaced or dropped in it, so processes sharing the
+        files do not overwrite each other's objects.
+        """
+        start = time.perf_counter()
+        s_class = cls.__name__
+        written = 0
+        with cls._lock(), cls._file_lock():
+            layout = cls._shards()
+            by_shard = None
+            if changed is not None:
+                by_shard = {}
+                for obj_id in changed:
+                    by_shard.setdefault(cls._shard_of(obj_id), []).append(
+                        obj_id)
+                shards = sorted(by_shard)
+            elif shards is None:
+                shards = range(len(layout))
+            for shard in shards:
+                if len(layout) == 1:
+                    file_path = cls._file_path()
+                else:
+                    file_path = cls._file_path(shard)
+                merge = by_shard is not None and \
+                    cls._replaced_since(file_path)
+                if merge:
+                    objs_json = {}
+                    if path.exists(file_path):
+                        with open(file_path, 'r') as f:
+                            objs_json = json.load(f)
+                    for obj_id in by_shard[shard]:
+                        obj = DATA[s_class].get(obj_id)
+                        if obj is None:
+                            objs_json.pop(obj_id, None)
+                        else:
+                            objs_json[obj_id] = obj._cached_json(True)
+                else:
+                    objs_json = {}
+                    for obj_id in layout[shard]:
+                        objs_json[obj_id] = \
+                            DATA[s_class][obj_id]._cached_json(True)
+                written += cls._write_file(file_path, objs_json)
+                # Once merged, the file holds objects this process does not
+                # have, so it must never be rewritten from memory again
+                FILE_SIGNATURES[file_path] = 'merged' if merge else \
+                    cls._file_signature(os.stat(file_path))
+            if len(layout) > 1 and not path.exists(cls._manifest_path()):
+                cls._write_file(cls._manifest_path(),
+                                {'shards': len(layout)})
+        STATS['save_to_file_calls'] += 1
+        STATS['save_to_file_seconds'] += time.perf_counter() - start
+        STATS['save_to_file_bytes'] += written
 
     @classmethod
-    def save_to_file(cls):
-        """ Save all objects to file
+    def _replaced_since(cls, file_path: str) -> bool:
+        """ Whether `file_path` may hold changes of another process since
+        this one last loaded or wrote it
         """
+        try:
+            signature = cls._file_signature(os.stat(file_path))
+        except FileNotFoundError:
+            signature = None
+        return FILE_SIGNATURES.get(file_path, 'unknown') != signature
+
+    @staticmethod
+    def _write_file(file_path: str, content: dict) -> int:
+        """ Atomically replace `file_path` with `content` as JSON
+
+        The content is written to a temporary file of its own in the same
+        directory first. Returns the number of bytes written.
+        """
+        fd, tmp_path = tempfile.mkstemp(
+            dir=path.dirname(file_path) or '.',
+            prefix="{}.".format(path.basename(file_path)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(content, f)
+                written = f.tell()
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return written
+
+    @classmethod
+    def reshard(cls, n_shards: int):
+        """ Rewrite the loaded objects into `n_shards` files
+
+        Meant to be run offline (see models/reshard.py): files of the
+        previous layout are removed once the new one is written.
+        """
+        if n_shards < 1:
+            raise ValueError("n_shards must be at least 1")
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        SHARDS[s_class] = [set() for _ in range(n_shards)]
+        for obj_id in DATA.get(s_class, {}):
+            SHARDS[s_class][cls._shard_of(obj_id)].add(obj_id)
+        cls.save_to_file()
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+        stale = glob.glob(".db_{}-[0-9]*.json".format(s_class))
+        if n_shards == 1:
+            stale.append(cls._manifest_path())
+        else:
+            stale.append(cls._file_path())
+            cls._write_file(cls._manifest_path(), {'shards': n_shards})
+            keep = {cls._file_path(i) for i in range(n_shards)}
+            stale = [p for p in stale if p not in keep]
+        for file_path in stale:
+            if path.exists(file_path):
+                os.remove(file_path)
 
     def save(self):
         """ Save current object
         """
         s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        with self._lock():
+            self.updated_at = datetime.utcnow()
+            if self.id not in DATA[s_class]:
+                ids = SORTED_IDS.get(s_class)
+                if ids is not None:
+                    bisect.insort(ids, self.id)
+            DATA[s_class][self.id] = self
+            self._update_indexes()
+            self._cached_json(False)
+            shard = self._shard_of(self.id)
+            self._shards()[shard].add(self.id)
+            self._bump_generation()
+            self.__class__.save_to_file(changed=[self.id])
+        self._notify('save', self)
+
+    @classmethod
+    def save_many(cls, objs: List[TypeVar('Base')]):
+        """ Save several objects at once
+
+        Each touched shard is written once, whatever the number of
+        objects, and the generation is bumped once.
+        """
+        s_class = cls.__name__
+        with cls._lock():
+            store = DATA.setdefault(s_class, {})
+            layout = cls._shards()
+            now = datetime.utcnow()
+            new_ids = []
+            for obj in objs:
+                obj.updated_at = now
+                if obj.id not in store:
+                    new_ids.append(obj.id)
+                store[obj.id] = obj
+                obj._update_indexes()
+                obj._cached_json(False)
+                shard = cls._shard_of(obj.id)
+                layout[shard].add(obj.id)
+            ids = SORTED_IDS.get(s_class)
+            if ids is not None and new_ids:
+                ids = ids + new_ids
+                ids.sort()
+                SORTED_IDS[s_class] = ids
+            cls._bump_generation()
+            cls.save_to_file(changed=[obj.id for obj in objs])
+        for obj in objs:
+            cls._notify('save', obj)
 
     def remove(self):
         """ Remove object
         """
         s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
+        with self._lock():
+            if DATA[s_class].get(self.id) is None:
+                return
             del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+            ids = SORTED_IDS.get(s_class)
+            if ids is not None:
+                index = bisect.bisect_left(ids, self.id)
+                if index < len(ids) and ids[index] == self.id:
+                    del ids[index]
+            self._update_indexes(removed=True)
+            shard = self._shard_of(self.id)
+            self._shards()[shard].discard(self.id)
+            self._bump_generation()
+            self.__class__.save_to_file(changed=[self.id])
+        self._notify('remove', self)
+
+    def version(self) -> str:
+        """ Return an identifier of the current state of the object,
+        usable as a strong ETag
+        """
+        return "{}-{:.6f}".format(self.id, self.updated_at.timestamp())
 
     @classmethod
     def count(cls) -> int:
@@ -114,6 +538,149 @@ class Base():
         """
         return cls.search()
 
+    @classmethod
+    def sorted_ids(cls) -> List[str]:
+        """ Return the IDs of all objects in ascending order
+
+        The list is built on first use after a load, under the class lock
+        so no concurrent save is missed, then kept sorted by save and
+        remove. It is shared and must not be modified.
+        """
+        s_class = cls.__name__
+        ids = SORTED_IDS.get(s_class)
+        if ids is None:
+            with cls._lock():
+                ids = SORTED_IDS.get(s_class)
+                if ids is None:
+                    ids = sorted(DATA.get(s_class, {}))
+                    SORTED_IDS[s_class] = ids
+        return ids
+
+    @classmethod
+    def page(cls, cursor: str = None, limit: int = None,
+             ids: List[str] = None) -> Tuple[List[TypeVar('Base')],
+                                             Optional[str]]:
+        """ Return up to `limit` objects in ID order, starting after the
+        ID `cursor`, and the cursor of the next page (None after the last
+        page)
+
+        Only the page is copied, so walking all objects page by page uses
+        memory proportional to the page size. `ids` restricts the listing
+        to a sorted list of IDs, by default all of them.
+        """
+        s_class = cls.__name__
+        if ids is None:
+            ids = cls.sorted_ids()
+        start = 0 if cursor is None else bisect.bisect_right(ids, cursor)
+        page_ids = ids[start:] if limit is None else ids[start:start + limit]
+        objs = DATA.get(s_class, {})
+        page = [objs[obj_id] for obj_id in page_ids if obj_id in objs]
+        if not page_ids or start + len(page_ids) >= len(ids):
+            return page, None
+        return page, page_ids[-1]
+
+    def _index_keys(self) -> frozenset:
+        """ Entries of the object in the indexes of its class:
+        ('hash', attribute, value) and ('prefix', index name, lowercase
+        string) tuples
+        """
+        keys = [('hash', attr, getattr(self, attr, None))
+                for attr in self._hash_indexes]
+        for name, attrs in self._prefix_indexes.items():
+            for attr in attrs:
+                value = getattr(self, attr, None)
+                if isinstance(value, str):
+                    keys.append(('prefix', name, value.lower()))
+        return frozenset(keys)
+
+    @classmethod
+    def _indexes(cls) -> Tuple[dict, dict]:
+        """ Return the hash indexes ({attribute: {value: set of IDs}}) and
+        the prefix indexes ({name: sorted list of (key, ID)}) of the
+        class, building them on first use after a load, under the class
+        lock so no concurrent save is missed
+        """
+        s_class = cls.__name__
+        hashes = HASH_INDEXES.get(s_class)
+        prefixes = PREFIX_INDEXES.get(s_class)
+        if hashes is not None and prefixes is not None:
+            return hashes, prefixes
+        with cls._lock():
+            hashes = HASH_INDEXES.get(s_class)
+            prefixes = PREFIX_INDEXES.get(s_class)
+            if hashes is not None and prefixes is not None:
+                return hashes, prefixes
+            hashes = {attr: {} for attr in cls._hash_indexes}
+            prefixes = {name: [] for name in cls._prefix_indexes}
+            for obj in DATA.get(s_class, {}).values():
+                obj._indexed = obj._index_keys()
+                for kind, name, key in obj._indexed:
+                    if kind == 'hash':
+                        hashes[name].setdefault(key, set()).add(obj.id)
+                    else:
+                        prefixes[name].append((key, obj.id))
+            for entries in prefixes.values():
+                entries.sort()
+            HASH_INDEXES[s_class] = hashes
+            PREFIX_INDEXES[s_class] = prefixes
+        return hashes, prefixes
+
+    def _update_indexes(self, removed: bool = False):
+        """ Move the object in the indexes of its class, if they are
+        built, from its entries at the last update to its current ones
+        """
+        s_class = self.__class__.__name__
+        hashes = HASH_INDEXES.get(s_class)
+        prefixes = PREFIX_INDEXES.get(s_class)
+        if hashes is None or prefixes is None:
+            return
+        old = self.__dict__.get('_indexed', frozenset())
+        new = frozenset() if removed else self._index_keys()
+        self._indexed = new
+        for kind, name, key in old - new:
+            if kind == 'hash':
+                ids = hashes[name].get(key)
+                if ids is not None:
+                    ids.discard(self.id)
+                    if not ids:
+                        del hashes[name][key]
+            else:
+                entries = prefixes[name]
+                index = bisect.bisect_left(entries, (key, self.id))
+                if index < len(entries) and \
+                        entries[index] == (key, self.id):
+                    del entries[index]
+        for kind, name, key in new - old:
+            if kind == 'hash':
+                hashes[name].setdefault(key, set()).add(self.id)
+            else:
+                bisect.insort(prefixes[name], (key, self.id))
+
+    @classmethod
+    def find_ids(cls, attr: str, value: object) -> List[str]:
+        """ Return the sorted IDs of the objects whose attribute `attr`,
+        which must have a hash index, equals `value`
+        """
+        hashes, _ = cls._indexes()
+        return sorted(hashes[attr].get(value, ()))
+
+    @classmethod
+    def find_prefix_ids(cls, name: str, prefix: str) -> List[str]:
+        """ Return the sorted IDs of the objects with a value in the
+        prefix index `name` starting with `prefix`, case-insensitively
+
+        The cost is a binary search plus the number of matches.
+        """
+        _, prefixes = cls._indexes()
+        entries = prefixes[name]
+        prefix = prefix.lower()
+        ids = set()
+        index = bisect.bisect_left(entries, (prefix,))
+        while index < len(entries) and entries[index][0].startswith(prefix):
+            ids.add(entries[index][1])
+            index += 1
+        return sorted(ids)
+
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
@@ -124,6 +691,9 @@ class Base():
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+
+        Only the objects found by a hash index are scanned when one of the
+        attributes has one.
         """
         s_class = cls.__name__
 
@@ -135,4 +705,20 @@ class Base():
                     return False
             return True
 
-        return list(filter(_search, DATA[s_class].values()))
+        candidates = DATA[s_class].values()
+        for attr in cls._hash_indexes:
+            if attr in attributes:
+                hashes, _ = cls._indexes()
+                try:
+                    ids = hashes[attr].get(attributes[attr], ())
+                except TypeError:
+                    continue
+                candidates = [DATA[s_class][obj_id] for obj_id in list(ids)
+                              if obj_id in DATA[s_class]]
+                break
+
+        result = list(filter(_search, candidates))
+        STATS['search_calls'] += 1
+        STATS['search_scanned'] += len(candidates)
+        STATS['search_matched'] += len(result)
+        return result
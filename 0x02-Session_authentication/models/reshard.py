@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+""" Offline resharding tool
+
+Usage (from the project root, with the API stopped):
+    python3 -m models.reshard <number of shards> [Class ...]
+"""
+from models.user import User
+import sys
+
+
+MODELS = {'User': User}
+
+
+def main(argv: list) -> int:
+    """ Reshard the storage files of the given models (all by default)
+    """
+    if len(argv) < 2 or not argv[1].isdigit() or int(argv[1]) < 1:
+        print("Usage: {} <number of shards> [Class ...]".format(argv[0]))
+        return 1
+    n_shards = int(argv[1])
+    names = argv[2:] or list(MODELS.keys())
+    for name in names:
+        if name not in MODELS:
+            print("Unknown class: {}".format(name))
+            return 1
+    for name in names:
+        cls = MODELS[name]
+        cls.load_from_file()
+        cls.reshard(n_shards)
+        print("{}: {} objects in {} shard(s)".format(
+            name, cls.count(), n_shards))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -2,12 +2,22 @@
 """ User module
 """
 import hashlib
-from models.base import Base
+from models.base import Base, DATA, STATS
+from models.bloom import CountingBloomFilter
+
+
+STATS['email_filter_rejections'] = 0
 
 
 class User(Base):
     """ User class
     """
+    _transient = Base._transient + ('_filtered_email',)
+    _fields = Base._fields + ('email', 'first_name', 'last_name')
+    _hash_indexes = ('email',)
+    _prefix_indexes = {'email': ('email',),
+                       'name': ('first_name', 'last_name')}
+    email_filter = CountingBloomFilter()
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
@@ -57,3 +67,79 @@ class User(Base):
             return "{}".format(self.last_name)
         else:
             return "{} {}".format(self.first_name, self.last_name)
+
+    @classmethod
+    def load_from_file(cls):
+        """ Load all users from file and rebuild the email filter
+        """
+        super().load_from_file()
+        cls.rebuild_email_filter()
+
+    @classmethod
+    def rebuild_email_filter(cls):
+        """ Rebuild the email filter from the loaded users
+
+        The users are copied and the filter swapped under the class lock,
+        which saves and removes also hold while they move emails in the
+        filter and change the users, so no change is lost in between.
+        """
+        with cls._lock():
+            users = list(DATA.get(cls.__name__, {}).values())
+            for user in users:
+                user._filtered_email = user.email
+            cls.email_filter.rebuild(
+                (u.email for u in users if u.email is not None), len(users))
+
+    @classmethod
+    def email_may_exist(cls, email: str) -> bool:
+        """ Return False if no user surely has this email, without
+        searching the users
+        """
+        if email in cls.email_filter:
+            return True
+        STATS['email_filter_rejections'] += 1
+        return False
+
+    def _track_email(self):
+        """ Move the email of the user in the email filter if it changed
+        since the last save
+        """
+        old_email = self.__dict__.get('_filtered_email')
+        if self.email != old_email:
+            if self.email is not None:
+                self.email_filter.add(self.email)
+            if old_email is not None:
+                self.email_filter.discard(old_email)
+            self._filtered_email = self.email
+
+    def save(self):
+        """ Save the user and keep the email filter up to date
+        """
+        with self._lock():
+            self._track_email()
+            super().save()
+            if self.email_filter.needs_rebuild():
+                self.rebuild_email_filter()
+
+    @classmethod
+    def save_many(cls, users: list):
+        """ Save several users at once and keep the email filter up to
+        date
+        """
+        with cls._lock():
+            for user in users:
+                user._track_email()
+            super().save_many(users)
+            if cls.email_filter.needs_rebuild():
+                cls.rebuild_email_filter()
+
+    def remove(self):
+        """ Remove the user and its email from the email filter
+        """
+        with self._lock():
+            super().remove()
+            old_email = self.__dict__.pop('_filtered_email', None)
+            if old_email is not None:
+                self.email_filter.discard(old_email)
+                if self.email_filter.needs_rebuild():
+                    self.rebuild_email_filter()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests of the session snapshots across restarts.
+"""
+from api.v1.auth.session_snapshot import SessionSnapshotter, dump_sessions
+from api.v1.auth.session_store import MemorySessionStore
+import os
+import tempfile
+import unittest
+
+
+class TestSessionSnapshotter(unittest.TestCase):
+    """
+    Restarts are simulated with a new store and snapshotter on the same
+    snapshot path.
+    """
+
+    def setUp(self):
+        """
+        Creates an empty snapshot directory.
+        """
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'sessions')
+
+    def tearDown(self):
+        """
+        Removes the snapshot directory.
+        """
+        self.tmp.cleanup()
+
+    def restart(self) -> MemorySessionStore:
+        """
+        Starts a new process: loads the snapshots into a new store.
+        """
+        store = MemorySessionStore()
+        self.snapshotter = SessionSnapshotter(store, self.path, 3600)
+        self.snapshotter.load()
+        return store
+
+    def change(self) -> None:
+        """
+        Records a session change and snapshots it right away.
+        """
+        self.snapshotter.touch()
+        self.snapshotter.snapshot()
+
+    def test_session_survives_restart(self):
+        store = self.restart()
+        store.set('s1', 'u1', None)
+        self.change()
+        store = self.restart()
+        self.assertEqual(store.get('s1'), ('u1', None))
+
+    def test_logout_survives_restart(self):
+        store = self.restart()
+        store.set('s1', 'u1', None)
+        store.set('s2', 'u2', None)
+        self.change()
+        store = self.restart()
+        store.delete('s1')
+        self.change()
+        store = self.restart()
+        self.assertIsNone(store.get('s1'))
+        self.assertEqual(store.get('s2'), ('u2', None))
+        store = self.restart()
+        self.assertIsNone(store.get('s1'))
+
+    def test_logout_overrides_other_process_snapshots(self):
+        store = self.restart()
+        store.set('s1', 'u1', None)
+        self.change()
+        store = self.restart()
+        with open('{}-{}'.format(self.path, os.getpid() + 1), 'wb') as f:
+            f.write(dump_sessions(dict(store.sessions)))
+        store.delete_user('u1')
+        self.change()
+        store = self.restart()
+        self.assertIsNone(store.get('s1'))
+
+    def test_expired_sessions_are_dropped(self):
+        store = self.restart()
+        store.set('s1', 'u1', 1.0)
+        self.change()
+        store = self.restart()
+        self.assertIsNone(store.get('s1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
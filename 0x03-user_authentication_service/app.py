@@ -6,12 +6,24 @@ a reset password token, and to update the password.
 """
 from auth import Auth
 from flask import Flask, jsonify, request, abort, redirect
+from rate_limit import (RateLimitExceeded, check_email, check_ip,
+                        request_ip)
 
 AUTH = Auth()
 
 app = Flask(__name__)
 
 
+@app.errorhandler(RateLimitExceeded)
+def rate_limited(error: RateLimitExceeded) -> str:
+    """
+    Responds to a rate limited login with 429 and a Retry-After header.
+    """
+    response = jsonify({"message": "too many requests"})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+
 @app.route('/')
 def message() -> str:
     """Returns a JSON payload"""
@@ -40,11 +52,15 @@ def login() -> str:
     a JSON payload of the form.
 
     Raises:
+        429 Too Many Requests: If the client IP or the email has no login
+        attempt left.
         401 Unauthorized: Raises a 401 error to indicate unauthorized access.
     """
     email = request.form.get('email')
     password = request.form.get('password')
 
+    check_ip(request_ip(request))
+    check_email(email)
     if AUTH.valid_login(email, password):
         session_id = AUTH.create_session(email)
         response = jsonify({"email": email, "message": "logged in"})
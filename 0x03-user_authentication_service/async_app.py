@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+ASGI variant of the Flask app in `app.py`, built with Quart. It provides
+the same endpoints with coroutine views backed by `AsyncAuth`.
+
+Run with an ASGI server, e.g.:
+    hypercorn --workers 4 --bind 0.0.0.0:5000 async_app:app
+"""
+from async_auth import AsyncAuth
+from quart import Quart, jsonify, request, abort, redirect
+from rate_limit import (RateLimitExceeded, check_email, check_ip,
+                        request_ip)
+
+AUTH = AsyncAuth()
+
+app = Quart(__name__)
+
+
+@app.errorhandler(RateLimitExceeded)
+async def rate_limited(error: RateLimitExceeded) -> str:
+    """
+    Responds to a rate limited login with 429 and a Retry-After header.
+    """
+    response = jsonify({"message": "too many requests"})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+
+@app.route('/')
+async def message() -> str:
+    """Returns a JSON payload"""
+    return jsonify({"message": "Bienvenue"})
+
+
+@app.route('/users', methods=['POST'])
+async def users() -> str:
+    """
+    Register a user with their email and password.
+    """
+    form = await request.form
+    email = form.get('email')
+    password = form.get('password')
+    try:
+        await AUTH.register_user(email, password)
+        return jsonify({"email": email, "message": "user created"})
+    except ValueError:
+        return jsonify({"message": "email already registered"}), 400
+
+
+@app.route('/sessions', methods=['POST'])
+async def login() -> str:
+    """
+    Creates a new session for the user and stores the session ID as a
+    cookie with key `session_id` on the response.
+
+    Raises:
+        429 Too Many Requests: If the client IP or the email has no login
+        attempt left.
+        401 Unauthorized: If the email or the password is wrong.
+    """
+    form = await request.form
+    email = form.get('email')
+    password = form.get('password')
+
+    check_ip(request_ip(request))
+    check_email(email)
+    if await AUTH.valid_login(email, password):
+        session_id = await AUTH.create_session(email)
+        response = jsonify({"email": email, "message": "logged in"})
+        response.set_cookie('session_id', session_id)
+        return response
+
+    abort(401)
+
+
+@app.route('/sessions', methods=['DELETE'])
+async def logout() -> str:
+    """
+    Logout route to destroy a user session, then redirect to the
+    homepage. Responds with 403 if no user has the session ID.
+    """
+    session_id = request.cookies.get('session_id')
+    user = await AUTH.get_user_from_session_id(session_id)
+    if user is None:
+        abort(403)
+    await AUTH.destroy_session(user.id)
+    return redirect('/')
+
+
+@app.route('/profile', methods=['GET'])
+async def profile() -> str:
+    """
+    Profile route to find the user based on session_id.
+    """
+    session_id = request.cookies.get('session_id')
+    user = await AUTH.get_user_from_session_id(session_id)
+    if user is None:
+        abort(403)
+    return jsonify({"email": user.email}), 200
+
+
+@app.route('/reset_password', methods=['POST'])
+async def get_reset_password_token() -> str:
+    """
+    Endpoint to generate a reset password token for a given email.
+    Responds with 403 if the email does not exist.
+    """
+    form = await request.form
+    email = form.get('email')
+    try:
+        reset_token = await AUTH.get_reset_password_token(email)
+        return jsonify({"email": email, "reset_token": reset_token}), 200
+    except Exception:
+        abort(403)
+
+
+@app.route('/reset_password', methods=['PUT'])
+async def update_password() -> str:
+    """
+    Endpoint to update the password using a reset token.
+    Responds with 403 if the password update fails.
+    """
+    form = await request.form
+    email = form.get('email')
+    reset_token = form.get('reset_token')
+    new_password = form.get('new_password')
+
+    try:
+        await AUTH.update_password(reset_token, new_password)
+        return jsonify({"email": email, "message": "Password updated"}), 200
+    except Exception:
+        abort(403)
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+This module contains the `AsyncAuth` class, an asyncio front end of `Auth`
+for the ASGI variant of the service.
+
+bcrypt releases the GIL, so hashing and password checks run in parallel
+in a thread pool. The SQLAlchemy session is not thread-safe, so every
+database access goes through a single-thread executor.
+"""
+import asyncio
+import bcrypt
+from auth import Auth, _hash_password
+from concurrent.futures import ThreadPoolExecutor
+from os import getenv
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm.exc import NoResultFound
+from typing import Optional
+from user import User
+
+
+class AsyncAuth(Auth):
+    """AsyncAuth class to interact with the authentication database
+    from coroutines.
+    """
+    def __init__(self):
+        super().__init__()
+        self._hash_executor = ThreadPoolExecutor(
+            max_workers=int(getenv('HASH_WORKERS', '4')),
+            thread_name_prefix='hash')
+        self._db_executor = ThreadPoolExecutor(max_workers=1,
+                                               thread_name_prefix='db')
+
+    async def _hash(self, func, *args):
+        """
+        Runs a bcrypt function in the hashing thread pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._hash_executor, func, *args)
+
+    async def _query(self, func, *args):
+        """
+        Runs a database function in the database executor.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_executor, func, *args)
+
+    async def _find_user(self, **kwargs) -> Optional[User]:
+        """
+        Finds a user, returning None instead of raising.
+        """
+        def _find():
+            try:
+                return self._db.find_user_by(**kwargs)
+            except (NoResultFound, InvalidRequestError):
+                return None
+        return await self._query(_find)
+
+    async def register_user(self, email: str, password: str) -> User:
+        """
+        Registers a user if it is not already exists.
+
+        Args:
+            email (str): User email.
+            password (str): User password.
+
+        Returns:
+            User (obj): A user object.
+
+        Raises:
+            ValueError: If a user already exists with the provided email.
+        """
+        if await self._find_user(email=email) is not None:
+            raise ValueError(f'User {email} already exists')
+        hashed_pwd = await self._hash(_hash_password, password)
+        user = await self._query(self._db.add_user, email, hashed_pwd)
+        await self._query(self._add_email, email)
+        return user
+
+    async def valid_login(self, email: str, password: str) -> bool:
+        """
+        Checks if the user uses a valid email and password.
+
+        Args:
+            email (str): User email.
+            password (str): User password.
+
+        Returns:
+            Boolean: True if password matches otherwise False.
+        """
+        if email is None or password is None:
+            return False
+        if not await self._query(self.email_may_exist, email):
+            return False
+        user = await self._find_user(email=email)
+        if user is None:
+            return False
+        return await self._hash(bcrypt.checkpw, password.encode('utf-8'),
+                                user.hashed_password)
+
+    async def create_session(self, email: str) -> str:
+        """
+        Generates a new session ID for the user with this email.
+
+        Args:
+            email (str): User email.
+
+        Returns:
+            str: User's session_id, or None if no user has this email.
+        """
+        return await self._query(super().create_session, email)
+
+    async def get_user_from_session_id(self, session_id: str) -> User:
+        """
+        Gets the user based on the session_id.
+
+        Args:
+            session_id (str): Session id.
+
+        Returns:
+            User (obj): User object, or None.
+        """
+        if session_id is None:
+            return None
+        return await self._find_user(session_id=session_id)
+
+    async def destroy_session(self, user_id: int) -> None:
+        """
+        Updates the corresponding user's session ID to None.
+
+        Args:
+            user_id (int): User ID.
+        """
+        return await self._query(super().destroy_session, user_id)
+
+    async def get_reset_password_token(self, email: str) -> str:
+        """
+        Generates a reset password token for the user with this email.
+
+        Args:
+            email (str): User email.
+
+        Returns:
+            str: The generated reset password token.
+
+        Raises:
+            ValueError: If no user is found with the provided email.
+        """
+        return await self._query(super().get_reset_password_token, email)
+
+    async def update_password(self, reset_token: str, password: str) -> None:
+        """
+        Updates the password of the user holding the reset token.
+
+        Args:
+            reset_token (str): The reset token associated with the user.
+            password (str): The new password to set for the user.
+
+        Raises:
+            ValueError: If no user is found with the provided reset token
+        """
+        user = await self._find_user(reset_token=reset_token)
+        if user is None:
+            raise ValueError
+        hashed_pwd = await self._hash(_hash_password, password)
+
+        def _update():
+            user.hashed_password = hashed_pwd
+            user.reset_token = None
+        await self._query(_update)
@@ -6,8 +6,10 @@ that returns a string representation of UUID, and a class `Auth` to
 interact with the authentication database .
 """
 import bcrypt
+from bloom import CountingBloomFilter
 from db import DB
 from user import User
+from sqlalchemy import select
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.exc import InvalidRequestError
 from uuid import uuid4
@@ -39,6 +41,66 @@ class Auth:
     """
     def __init__(self):
         self._db = DB()
+        self._emails = CountingBloomFilter()
+        self._last_user_id = 0
+        self.rebuild_email_filter()
+
+    def rebuild_email_filter(self) -> None:
+        """
+        Rebuilds the filter of registered emails from the database, on a
+        connection of its own so the session stays unbound to the caller
+        thread.
+        """
+        with self._db._engine.connect() as connection:
+            rows = connection.execute(select(User.id, User.email)).all()
+        self._emails.rebuild([email for _, email in rows], len(rows))
+        self._last_user_id = max((user_id for user_id, _ in rows),
+                                 default=0)
+
+    def sync_email_filter(self) -> None:
+        """
+        Adds to the filter the emails of the users registered since the
+        last sync, by this process or any other one sharing the database.
+        Users get increasing integer IDs, so this is a range query on the
+        primary key.
+        """
+        with self._db._engine.connect() as connection:
+            rows = connection.execute(
+                select(User.id, User.email).where(
+                    User.id > self._last_user_id)).all()
+        for user_id, email in rows:
+            self._emails.add(email)
+            self._last_user_id = max(self._last_user_id, user_id)
+        if self._emails.needs_rebuild():
+            self.rebuild_email_filter()
+
+    def _add_email(self, email: str) -> None:
+        """
+        Adds a newly registered email to the filter of registered emails.
+        """
+        self._emails.add(email)
+        if self._emails.needs_rebuild():
+            self.rebuild_email_filter()
+
+    def email_may_exist(self, email: str) -> bool:
+        """
+        Checks the filter of registered emails. The filter of a process
+        does not know the users registered by other workers, so it is
+        synced with the database before answering False.
+
+        Args:
+            email (str): User email.
+
+        Returns:
+            Boolean: False if no user surely has this email, True if one
+            may have it.
+        """
+        if not isinstance(email, str):
+            return False
+        if email in self._emails:
+            return True
+        self.sync_email_filter()
+        return email in self._emails
 
     def register_user(self, email: str, password: str) -> User:
         """
@@ -58,8 +120,11 @@ class Auth:
             self._db.find_user_by(email=email)
             raise ValueError(f'User {email} already exists')
         except NoResultFound:
-            hashed_pwd = _hash_password(password)
-            return self._db.add_user(email, hashed_pwd)
+            pass
+        hashed_pwd = _hash_password(password)
+        user = self._db.add_user(email, hashed_pwd)
+        self._add_email(email)
+        return user
 
     def valid_login(self, email: str, password: str) -> bool:
         """
@@ -72,6 +137,8 @@ class Auth:
         Returns:
             Boolean: True if password matches otherwise False.
         """
+        if not self.email_may_exist(email):
+            return False
         try:
             user = self._db.find_user_by(email=email)
             hashed_pwd = user.hashed_password
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Concurrent login load test, to compare the sync (`app.py`) and async
+(`async_app.py`) services at the same worker count, e.g.:
+
+    gunicorn --workers 2 --bind 127.0.0.1:5000 app:app
+    ./bench_login.py --url http://127.0.0.1:5000 --concurrency 32
+
+    hypercorn --workers 2 --bind 127.0.0.1:5000 async_app:app
+    ./bench_login.py --url http://127.0.0.1:5000 --concurrency 32
+
+Start the servers with RATE_LIMIT_IP_RATE=0 and RATE_LIMIT_EMAIL_RATE=0 to
+measure raw throughput rather than the rate limiter. Results are printed
+as JSON.
+"""
+import argparse
+import json
+import requests
+import threading
+import time
+import uuid
+
+
+def percentile(values: list, ratio: float) -> float:
+    """
+    Returns the value at the given ratio of the sorted values.
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(ratio * len(values)))]
+
+
+def register_users(url: str, count: int, password: str) -> list:
+    """
+    Registers `count` users with unique emails and returns the emails.
+    """
+    emails = []
+    with requests.Session() as session:
+        for _ in range(count):
+            email = 'bench-{}@example.com'.format(uuid.uuid4().hex)
+            session.post(url + '/users',
+                         data={'email': email, 'password': password})
+            emails.append(email)
+    return emails
+
+
+def run(url: str, emails: list, password: str, concurrency: int,
+        duration: float) -> dict:
+    """
+    Logs in concurrently for `duration` seconds, each thread reusing one
+    keep-alive connection.
+
+    Returns:
+        dict: The throughput, error count and latency percentiles.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index: int):
+        local, failed = [], 0
+        with requests.Session() as session:
+            i = index
+            while time.perf_counter() < deadline:
+                email = emails[i % len(emails)]
+                i += concurrency
+                start = time.perf_counter()
+                response = session.post(
+                    url + '/sessions',
+                    data={'email': email, 'password': password})
+                local.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(i,))
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'throughput_rps': round(len(latencies) / duration, 1),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 2),
+            'p90': round(percentile(latencies, 0.90) * 1000, 2),
+            'p99': round(percentile(latencies, 0.99) * 1000, 2),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--users', type=int, default=50)
+    args = parser.parse_args()
+
+    password = 'bench-password'
+    emails = register_users(args.url, args.users, password)
+    result = run(args.url, emails, password, args.concurrency, args.duration)
+    result.update(url=args.url, concurrency=args.concurrency)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+""" Counting Bloom filter module
+"""
+from threading import Lock
+from typing import Iterable, List
+import hashlib
+import math
+import os
+
+
+class CountingBloomFilter():
+    """ Probabilistic set of strings supporting removal
+
+    Membership tests never give false negatives for items that were
+    added and not discarded; they give false positives at a rate close
+    to `error_rate` while at most `capacity` items are stored. Each slot
+    is an 8-bit counter; a saturated counter is never decremented again.
+    """
+
+    def __init__(self, capacity: int = 1024, error_rate: float = 0.01):
+        """ Initialize an empty filter
+        """
+        self._lock = Lock()
+        self.error_rate = error_rate
+        self._table = self._new_table(capacity)
+        os.register_at_fork(after_in_child=self._reinit)
+
+    def _reinit(self):
+        """ Replace the lock inherited by a freshly forked process
+        """
+        self._lock = Lock()
+
+    def _new_table(self, capacity: int) -> dict:
+        """ Build empty counters sized for `capacity` items
+
+        The whole state lives in one dictionary, swapped at once by
+        `rebuild`, so lock-free readers always see a consistent table.
+        """
+        capacity = max(capacity, 1)
+        size = max(8, math.ceil(-capacity * math.log(self.error_rate) /
+                                math.log(2) ** 2))
+        return {
+            'capacity': capacity,
+            'size': size,
+            'hashes': max(1, round(size / capacity * math.log(2))),
+            'counters': bytearray(size),
+            'nonzero': 0,
+            'saturated': False,
+            'count': 0,
+        }
+
+    @staticmethod
+    def _slots(table: dict, item: str) -> List[int]:
+        """ Counter indexes of an item (double hashing)
+        """
+        digest = hashlib.blake2b(item.encode('utf-8'),
+                                 digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        size = table['size']
+        return [(h1 + i * h2) % size for i in range(table['hashes'])]
+
+    @classmethod
+    def _increment(cls, table: dict, item: str):
+        """ Increment the counters of an item
+        """
+        counters = table['counters']
+        for slot in cls._slots(table, item):
+            value = counters[slot]
+            if value == 255:
+                table['saturated'] = True
+                continue
+            if value == 0:
+                table['nonzero'] += 1
+            counters[slot] = value + 1
+        table['count'] += 1
+
+    def add(self, item: str):
+        """ Add an item
+        """
+        with self._lock:
+            self._increment(self._table, item)
+
+    def discard(self, item: str):
+        """ Remove an item that was added before
+        """
+        with self._lock:
+            table = self._table
+            counters = table['counters']
+            for slot in self._slots(table, item):
+                value = counters[slot]
+                if value == 0 or value == 255:
+                    continue
+                if value == 1:
+                    table['nonzero'] -= 1
+                counters[slot] = value - 1
+            table['count'] = max(table['count'] - 1, 0)
+
+    def __contains__(self, item: str) -> bool:
+        """ Return False if the item was surely never added
+        """
+        table = self._table
+        counters = table['counters']
+        for slot in self._slots(table, item):
+            if counters[slot] == 0:
+                return False
+        return True
+
+    def __len__(self) -> int:
+        """ Number of items stored
+        """
+        return self._table['count']
+
+    def false_positive_rate(self) -> float:
+        """ Estimate the current false positive rate from the share of
+        non-empty counters
+        """
+        table = self._table
+        return (table['nonzero'] / table['size']) ** table['hashes']
+
+    def needs_rebuild(self) -> bool:
+        """ Return True once the filter drifted away from its target
+        false positive rate (too many items or saturated counters)
+        """
+        table = self._table
+        return table['saturated'] or table['count'] > table['capacity'] \
+            or self.false_positive_rate() > 2 * self.error_rate
+
+    def rebuild(self, items: Iterable[str], count: int):
+        """ Refill the filter with `items`, sized for twice `count`
+
+        The new counters are filled aside and swapped in at once, so
+        concurrent membership tests never see a partially filled filter.
+        """
+        with self._lock:
+            table = self._new_table(max(2 * count, 1024))
+            for item in items:
+                self._increment(table, item)
+            self._table = table
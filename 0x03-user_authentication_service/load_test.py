@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Load-testing tool for the user authentication service, built on the
+register -> login -> profile -> logout -> reset password flow of
+`main.py`.
+
+Each virtual user keeps one keep-alive connection, registers with a
+unique email and then picks its next operation from a weighted mix.
+Latency percentiles and error rates are reported per endpoint as JSON.
+
+Usage:
+    ./load_test.py --url http://127.0.0.1:5000 --concurrency 16 \\
+        --duration 30 [--spawn "gunicorn -w 4 -b 127.0.0.1:5000 app:app"]
+
+With --spawn the server command is started from this directory, awaited
+and stopped at the end. Start the server with RATE_LIMIT_IP_RATE=0 and
+RATE_LIMIT_EMAIL_RATE=0, or the rate limiter will be what is measured.
+"""
+import argparse
+import json
+import random
+import requests
+import shlex
+import subprocess
+import threading
+import time
+import uuid
+from os import path
+
+MIX = {
+    'profile': 60,
+    'logout': 15,
+    'wrong_password': 5,
+    'reset_password': 10,
+    'register': 10,
+}
+
+
+def percentile(values: list, ratio: float) -> float:
+    """
+    Returns the value at the given ratio of the sorted values.
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(ratio * len(values)))]
+
+
+class Recorder:
+    """
+    Recorder collects latencies and errors per endpoint.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty recorder.
+        """
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def merge(self, latencies: dict, errors: dict) -> None:
+        """
+        Adds the samples collected by one virtual user.
+        """
+        with self._lock:
+            for endpoint, values in latencies.items():
+                self.latencies.setdefault(endpoint, []).extend(values)
+            for endpoint, count in errors.items():
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + count
+
+    def report(self, duration: float) -> dict:
+        """
+        Summarises the samples per endpoint.
+        """
+        endpoints = {}
+        total = 0
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            total += len(values)
+            errors = self.errors.get(endpoint, 0)
+            endpoints[endpoint] = {
+                'requests': len(values),
+                'errors': errors,
+                'error_rate': round(errors / len(values), 4),
+                'throughput_rps': round(len(values) / duration, 1),
+                'latency_ms': {
+                    'p50': round(percentile(values, 0.50) * 1000, 2),
+                    'p90': round(percentile(values, 0.90) * 1000, 2),
+                    'p99': round(percentile(values, 0.99) * 1000, 2),
+                    'max': round(values[-1] * 1000, 2),
+                },
+            }
+        return {
+            'duration_s': duration,
+            'requests': total,
+            'throughput_rps': round(total / duration, 1),
+            'endpoints': endpoints,
+        }
+
+
+class VirtualUser:
+    """
+    VirtualUser runs the operations of `main.py` over one keep-alive
+    connection.
+    """
+
+    def __init__(self, url: str, rng: random.Random):
+        """
+        Initializes a virtual user that is not registered yet.
+        """
+        self.url = url
+        self.rng = rng
+        self.session = requests.Session()
+        self.email = None
+        self.password = None
+        self.logged_in = False
+        self.latencies = {}
+        self.errors = {}
+
+    def _call(self, method: str, route: str, expected: int, **kwargs):
+        """
+        Sends one request and records its latency and outcome.
+        """
+        endpoint = '{} {}'.format(method, route)
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.url + route,
+                                            allow_redirects=False, **kwargs)
+            ok = response.status_code == expected
+        except requests.RequestException:
+            response, ok = None, False
+        self.latencies.setdefault(endpoint, []).append(
+            time.perf_counter() - start)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        return response if ok else None
+
+    def register(self) -> None:
+        """
+        Registers a new user with a unique email, then logs in. A failed
+        registration is retried at the next step.
+        """
+        self.email = 'load-{}@example.com'.format(uuid.uuid4().hex)
+        self.password = uuid.uuid4().hex[:12]
+        self.logged_in = False
+        if self._call('POST', '/users', 200, data={
+                'email': self.email, 'password': self.password}):
+            self.log_in()
+        else:
+            self.email = None
+
+    def log_in(self) -> None:
+        """
+        Logs in with the right password.
+        """
+        self.logged_in = self._call('POST', '/sessions', 200, data={
+            'email': self.email, 'password': self.password}) is not None
+
+    def wrong_password(self) -> None:
+        """
+        Logs in with a wrong password.
+        """
+        self._call('POST', '/sessions', 401, data={
+            'email': self.email, 'password': 'wrong-' + self.password})
+
+    def profile(self) -> None:
+        """
+        Reads the profile of the logged in user.
+        """
+        self._call('GET', '/profile', 200)
+
+    def logout(self) -> None:
+        """
+        Logs out; the session cookie is dropped by the redirect.
+        """
+        self._call('DELETE', '/sessions', 302)
+        self.session.cookies.clear()
+        self.logged_in = False
+
+    def reset_password(self) -> None:
+        """
+        Requests a reset token and sets a new password with it.
+        """
+        response = self._call('POST', '/reset_password', 200,
+                              data={'email': self.email})
+        if response is None:
+            return
+        new_password = uuid.uuid4().hex[:12]
+        if self._call('PUT', '/reset_password', 200, data={
+                'email': self.email,
+                'reset_token': response.json().get('reset_token'),
+                'new_password': new_password}):
+            self.password = new_password
+
+    def step(self) -> None:
+        """
+        Runs the next operation: register or log in when needed,
+        otherwise one operation picked from MIX.
+        """
+        if self.email is None:
+            return self.register()
+        if not self.logged_in:
+            return self.log_in()
+        name = self.rng.choices(list(MIX), weights=list(MIX.values()))[0]
+        getattr(self, name)()
+
+
+def wait_for(url: str, timeout: float = 15.0) -> None:
+    """
+    Waits until the server answers on `url`.
+
+    Raises:
+        RuntimeError: If the server does not answer in time.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url + '/', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError('Server not reachable at {}'.format(url))
+
+
+def run(url: str, concurrency: int, duration: float, seed: int) -> dict:
+    """
+    Runs `concurrency` virtual users for `duration` seconds.
+
+    Returns:
+        dict: The report of the run.
+    """
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+
+    def worker(index: int):
+        user = VirtualUser(url, random.Random(seed + index))
+        while time.perf_counter() < deadline:
+            user.step()
+        user.session.close()
+        recorder.merge(user.latencies, user.errors)
+
+    threads = [threading.Thread(target=worker, args=(i,))
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report = recorder.report(duration)
+    report.update(url=url, concurrency=concurrency, mix=MIX)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--spawn', help='server command to start first')
+    parser.add_argument('--output', help='write the JSON report here')
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn:
+        server = subprocess.Popen(shlex.split(args.spawn),
+                                  cwd=path.dirname(path.abspath(__file__)))
+    try:
+        wait_for(args.url)
+        report = run(args.url, args.concurrency, args.duration, args.seed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)